@@ -0,0 +1,45 @@
+"""Compare cached and uncached make_month_calendar rendering throughput.
+
+    python bench/bench_calendar.py [iterations]
+
+Simulates users paging back and forth through a year of months, the same
+pattern the nav_ callbacks produce.
+"""
+
+import datetime, os, sys, tempfile, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+TMP = tempfile.mkdtemp()
+os.environ.setdefault("LISTING_STORE", f"sqlite:{TMP}/bench.db")
+os.environ.setdefault("STATE_DB", f"{TMP}/state.db")
+import main
+
+
+def months(n):
+    today = datetime.date.today()
+    for i in range(n):
+        offset = i % 24 - 12
+        y, m = divmod(today.month - 1 + offset, 12)
+        yield today.year + y, m + 1
+
+
+def run(label, render, iterations):
+    started = time.perf_counter()
+    for year, month in months(iterations):
+        render(year, month)
+    elapsed = time.perf_counter() - started
+    print(f"{label:>9}: {iterations / elapsed:>12,.0f} keyboards/s  ({elapsed * 1e6 / iterations:.1f} µs each)")
+    return elapsed
+
+
+def bench(iterations):
+    today = datetime.date.today()
+    uncached = main._render_month_calendar.__wrapped__
+    slow = run("uncached", lambda y, m: uncached(y, m, today, True), iterations)
+    fast = run("cached", main.make_month_calendar, iterations)
+    print(f"  speedup: {slow / fast:.0f}x  {main._render_month_calendar.cache_info()}")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
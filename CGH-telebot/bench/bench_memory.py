@@ -0,0 +1,84 @@
+"""Compare memory of the dict listing layout against the Listing/Claim model.
+
+    python bench/bench_memory.py [listings]
+
+Generates a listings.json-style document (default 100k listings, 0-5 claims
+each, sizes and locations drawn from a few dozen wards) and loads it twice:
+as plain dicts, the way JSONListingStore used to hold it, and as Listing
+objects. Also times the binary snapshot codec against json for the model.
+"""
+
+import gc, json, sys, time, tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from models import Listing, dump_snapshot, load_snapshot
+
+ITEMS = ["Nitrile Gloves", "Surgical Masks", "Syringes", "Gauze Pads", "Bandages", "Saline", "Gowns", "Swabs"]
+SIZES = ["S", "M", "L", "XL", "NA"]
+WARDS = [f"CGH Ward {n}" for n in range(1, 41)]
+
+
+def document(n):
+    data = {}
+    for i in range(1, n + 1):
+        qty = 1 + i % 20
+        claims = [{"user_id": 5_000_000 + (i * 7 + c) % 20_000, "qty": 1, "time": f"{1 + c % 28} Oct, {1 + c % 12}pm"}
+                  for c in range(i % 6)]
+        day = 1 + i % 28
+        data[str(i)] = {
+            "poster_id": 1_000_000 + i % 500, "poster_name": f"poster{i % 500}", "item": ITEMS[i % len(ITEMS)],
+            "qty": qty, "remaining": max(qty - len(claims), 0), "size": SIZES[i % len(SIZES)],
+            "expiry": f"{day:02d}/{1 + i % 12:02d}/26", "location": WARDS[i % len(WARDS)],
+            "channel_msg_id": i, "kind": "photo" if i % 3 else "text", "claims": claims,
+        }
+    return json.dumps(data)
+
+
+def measure(label, build):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    held = build()
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:>14}: {size / 2 ** 20:8.1f} MB  (built in {elapsed:.2f}s)")
+    return held, size
+
+
+def bench(n):
+    text = document(n)
+    print(f"{n:,} listings, {text.count('user_id'):,} claims, {len(text) / 2 ** 20:.1f} MB of JSON")
+
+    dicts, dict_bytes = measure("dicts", lambda: {int(k): v for k, v in json.loads(text).items()})
+    del dicts
+
+    def build_models():
+        return {int(k): Listing.from_dict(int(k), v) for k, v in json.loads(text).items()}
+
+    models, model_bytes = measure("Listing model", build_models)
+    print(f"{'saving':>14}: {1 - model_bytes / dict_bytes:8.0%}")
+
+    listings = list(models.values())
+    started = time.perf_counter()
+    blob = dump_snapshot(listings)
+    encode = time.perf_counter() - started
+    started = time.perf_counter()
+    assert load_snapshot(blob) == listings
+    decode = time.perf_counter() - started
+
+    started = time.perf_counter()
+    as_json = json.dumps([l.to_dict(claims=True) for l in listings])
+    json_encode = time.perf_counter() - started
+    started = time.perf_counter()
+    [Listing.from_dict(d["id"], d) for d in json.loads(as_json)]
+    json_decode = time.perf_counter() - started
+
+    print(f"{'snapshot':>14}: {len(blob) / 2 ** 20:8.1f} MB  encode {encode:.2f}s  decode {decode:.2f}s")
+    print(f"{'json':>14}: {len(as_json) / 2 ** 20:8.1f} MB  encode {json_encode:.2f}s  decode {json_decode:.2f}s")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
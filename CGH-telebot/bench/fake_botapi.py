@@ -0,0 +1,189 @@
+"""Local stand-in for the Telegram Bot API, for load testing without the network.
+
+    python bench/fake_botapi.py --updates updates.jsonl --rate 500
+    python bench/fake_botapi.py --generate 5000 --rate 1000
+
+Then start the bot against it in webhook mode:
+
+    BOT_API_URL=http://127.0.0.1:8081 WEBHOOK_URL=http://127.0.0.1:8443 python main.py
+
+Once the bot calls setWebhook the server replays the recorded updates (one
+JSON update per line) to the webhook at the chosen rate, answers the bot's
+API calls with plausible fake results, and prints end-to-end updates/second
+when the bot goes quiet.
+"""
+
+import argparse, asyncio, itertools, json, statistics, time
+from collections import Counter
+
+from aiohttp import ClientSession, web
+
+_message_ids = itertools.count(1)
+
+
+def synthetic_updates(n, users=500):
+    """Private-chat /start and /instructions commands from ``users`` users."""
+    for i in range(n):
+        uid = 10_000 + i % users
+        text = "/start" if i % 2 == 0 else "/instructions"
+        yield {
+            "update_id": i + 1,
+            "message": {
+                "message_id": i + 1,
+                "date": int(time.time()),
+                "chat": {"id": uid, "type": "private", "first_name": f"User{uid}"},
+                "from": {"id": uid, "is_bot": False, "first_name": f"User{uid}", "username": f"user{uid}"},
+                "text": text,
+                "entities": [{"type": "bot_command", "offset": 0, "length": len(text)}],
+            },
+        }
+
+
+def _chat(chat_id):
+    if isinstance(chat_id, str) and chat_id.startswith("@"):
+        return {"id": -1001000000000, "type": "channel", "title": chat_id, "username": chat_id[1:]}
+    chat_id = int(chat_id)
+    if chat_id < 0:
+        return {"id": chat_id, "type": "supergroup", "title": "Group"}
+    return {"id": chat_id, "type": "private", "first_name": f"User{chat_id}", "username": f"user{chat_id}"}
+
+
+def _message(params, **extra):
+    msg = {
+        "message_id": int(params.get("message_id") or next(_message_ids)),
+        "date": int(time.time()),
+        "chat": _chat(params.get("chat_id", 1)),
+    }
+    if "text" in params:
+        msg["text"] = params["text"]
+    if "caption" in params:
+        msg["caption"] = params["caption"]
+    msg.update(extra)
+    return msg
+
+
+def _photo(file_id):
+    return [{"file_id": file_id, "file_unique_id": file_id[-16:], "width": 800, "height": 600}]
+
+
+def respond(method, params):
+    """Fake result for one Bot API call."""
+    if method == "getMe":
+        return {"id": 1, "is_bot": True, "first_name": "Fake Bot", "username": "fake_bot",
+                "can_join_groups": True, "can_read_all_group_messages": False,
+                "supports_inline_queries": False}
+    if method == "getChat":
+        return {**_chat(params["chat_id"]), "accent_color_id": 0, "max_reaction_count": 11}
+    if method == "sendPhoto":
+        return _message(params, photo=_photo(str(params.get("photo", "photo"))))
+    if method == "sendMediaGroup":
+        media = params.get("media") or []
+        return [_message(params, photo=_photo(str(m.get("media", "photo")))) for m in media]
+    if method == "sendDocument":
+        return _message(params, document={"file_id": "doc", "file_unique_id": "doc"})
+    if method in ("sendMessage", "editMessageText", "editMessageCaption", "editMessageReplyMarkup"):
+        return _message(params)
+    if method == "getUpdates":
+        return []
+    if method == "getFile":
+        return {"file_id": params.get("file_id"), "file_unique_id": "f", "file_path": "documents/file"}
+    return True
+
+
+class FakeBotAPI:
+    def __init__(self, updates, rate):
+        self.updates = updates
+        self.rate = rate
+        self.calls = Counter()
+        self.first_sent = None
+        self.last_call = None
+        self.acks = []
+        self.webhook = None
+        self.secret = None
+        self.done = asyncio.Event()
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        params = {}
+        if request.content_type == "application/json":
+            params = await request.json()
+        elif request.can_read_body:
+            for k, v in (await request.post()).items():
+                if isinstance(v, str):
+                    try:
+                        v = json.loads(v)
+                    except ValueError:
+                        pass
+                params[k] = v
+        self.calls[method] += 1
+        self.last_call = time.perf_counter()
+        if method == "getUpdates":
+            await asyncio.sleep(min(float(params.get("timeout") or 0), 1.0))
+        if method == "setWebhook" and params.get("url"):
+            self.webhook = params["url"]
+            self.secret = params.get("secret_token")
+            asyncio.create_task(self.replay())
+        return web.json_response({"ok": True, "result": respond(method, params)})
+
+    async def replay(self):
+        headers = {"X-Telegram-Bot-Api-Secret-Token": self.secret} if self.secret else {}
+        interval = 1 / self.rate
+        print(f"▶️ Replaying {len(self.updates)} updates to {self.webhook} at {self.rate}/s")
+        async with ClientSession() as session:
+            self.first_sent = time.perf_counter()
+            pending = []
+            for i, update in enumerate(self.updates):
+                target = self.first_sent + i * interval
+                delay = target - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                pending.append(asyncio.create_task(self._post(session, update, headers)))
+            await asyncio.gather(*pending)
+        # Wait for the bot to go quiet, then report
+        while time.perf_counter() - self.last_call < 1.0:
+            await asyncio.sleep(0.2)
+        self.report()
+        self.done.set()
+
+    async def _post(self, session, update, headers):
+        started = time.perf_counter()
+        async with session.post(self.webhook, json=update, headers=headers) as resp:
+            await resp.read()
+        self.acks.append(time.perf_counter() - started)
+
+    def report(self):
+        elapsed = self.last_call - self.first_sent
+        acks = sorted(self.acks)
+        print(f"✅ {len(self.updates)} updates in {elapsed:.2f}s → {len(self.updates) / elapsed:,.0f} updates/s end-to-end")
+        if acks:
+            p99 = acks[min(len(acks) - 1, int(len(acks) * 0.99))]
+            print(f"   webhook ack p50 {statistics.median(acks) * 1000:.1f} ms, p99 {p99 * 1000:.1f} ms")
+        print("   Bot API calls:", ", ".join(f"{m}={n}" for m, n in self.calls.most_common()))
+
+
+async def serve(args):
+    if args.updates:
+        with open(args.updates) as f:
+            updates = [json.loads(line) for line in f if line.strip()]
+    else:
+        updates = list(synthetic_updates(args.generate))
+    api = FakeBotAPI(updates, args.rate)
+    web_app = web.Application(client_max_size=64 * 1024 ** 2)
+    web_app.router.add_post("/bot{token}/{method}", api.handle)
+    web_app.router.add_get("/bot{token}/{method}", api.handle)
+    runner = web.AppRunner(web_app)
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    print(f"🧪 Fake Bot API on http://{args.host}:{args.port}")
+    await api.done.wait()
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--updates", help="JSONL file of recorded updates to replay")
+    parser.add_argument("--generate", type=int, default=1000, help="synthetic updates when --updates is not given")
+    parser.add_argument("--rate", type=float, default=200, help="updates per second")
+    asyncio.run(serve(parser.parse_args()))
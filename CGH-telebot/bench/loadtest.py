@@ -0,0 +1,250 @@
+"""Offline load test for the donation, claim and suggest-time flows.
+
+    python bench/loadtest.py                         # 1k, 10k and 100k listings
+    python bench/loadtest.py --listings 10000 --pairs 200 --concurrency 50
+
+Each run builds the real Application from main.py, swaps the network for an
+in-process fake Bot API (OfflineRequest) and pre-populates the store with
+``--listings`` listings. Then ``--pairs`` seller/buyer pairs run
+concurrently: the seller donates an item through the /newitem conversation,
+the buyer claims it through the claim_ deep link and private_message, and
+the seller either approves it (handle_claim_decision) or goes through the
+suggest-time loop that the buyer accepts.
+
+Outbound rate limits are lifted so the numbers measure the bot, not
+Telegram. Reports updates/s, p50/p99 handler latency and peak RSS.
+"""
+
+import argparse, asyncio, datetime, json, os, re, resource, subprocess, sys, tempfile, time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+ITEMS = ["Nitrile Gloves", "Surgical Masks", "Syringes", "Gauze Pads", "Bandages", "Saline", "Gowns", "Swabs"]
+SIZES = ["S", "M", "L", "XL", "NA"]
+WARDS = [f"Ward {n}" for n in range(1, 41)]
+
+
+def setup_env(tmp):
+    os.environ["LISTING_STORE"] = f"sqlite:{tmp}/listings.db"
+    os.environ["STATE_DB"] = f"{tmp}/state.db"
+    os.environ.setdefault("CHANNEL_EDIT_DELAY", "0.05")
+    os.environ.setdefault("BOT_TOKEN", "123:bench")
+    sys.path[:0] = [str(HERE.parent), str(HERE)]
+
+
+class Recorder:
+    """Remembers what the bot sent to each chat so virtual users can tap its buttons."""
+
+    def __init__(self):
+        self.calls = Counter()
+        self.sent = defaultdict(list)
+        self.event = asyncio.Event()
+
+    def record(self, method, params):
+        self.calls[method] += 1
+        if "chat_id" in params and ("reply_markup" in params or "text" in params or "caption" in params):
+            self.sent[params["chat_id"]].append(params)
+            self.event.set()
+
+    async def wait_for(self, chat_id, predicate, timeout=30):
+        deadline = time.monotonic() + timeout
+        while True:
+            for params in reversed(self.sent.get(chat_id, ())):
+                found = predicate(params)
+                if found:
+                    return found
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"nothing matching in chat {chat_id}")
+            self.event.clear()
+            try:
+                await asyncio.wait_for(self.event.wait(), 0.5)
+            except asyncio.TimeoutError:
+                pass
+
+
+def button_data(prefix):
+    """Predicate picking the first callback_data starting with ``prefix``."""
+    def predicate(params):
+        markup = params.get("reply_markup") or {}
+        for row in markup.get("inline_keyboard", []):
+            for b in row:
+                if b.get("callback_data", "").startswith(prefix):
+                    return b["callback_data"]
+    return predicate
+
+
+def make_offline_request(recorder):
+    from telegram.request import BaseRequest
+    from fake_botapi import respond
+
+    class OfflineRequest(BaseRequest):
+        """BaseRequest that answers Bot API calls in-process with fake results."""
+
+        async def initialize(self):
+            pass
+
+        async def shutdown(self):
+            pass
+
+        @property
+        def read_timeout(self):
+            return None
+
+        async def do_request(self, url, method, request_data=None, *args, **kwargs):
+            api = url.rsplit("/", 1)[-1]
+            params = request_data.parameters if request_data else {}
+            recorder.record(api, params)
+            return 200, json.dumps({"ok": True, "result": respond(api, params)}).encode()
+
+    return OfflineRequest()
+
+
+class Driver:
+    def __init__(self, app):
+        self.app = app
+        self.update_ids = iter(range(1, 10 ** 9))
+        self.latencies = []
+
+    def _user(self, uid):
+        return {"id": uid, "is_bot": False, "first_name": f"U{uid}", "username": f"u{uid}"}
+
+    async def _process(self, data):
+        from telegram import Update
+        update = Update.de_json({"update_id": next(self.update_ids), **data}, self.app.bot)
+        started = time.perf_counter()
+        await self.app.process_update(update)
+        self.latencies.append(time.perf_counter() - started)
+
+    async def text(self, uid, text):
+        msg = {
+            "message_id": next(self.update_ids), "date": int(time.time()),
+            "chat": {"id": uid, "type": "private", "first_name": f"U{uid}"},
+            "from": self._user(uid), "text": text,
+        }
+        if text.startswith("/"):
+            msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        await self._process({"message": msg})
+
+    async def tap(self, uid, data):
+        await self._process({"callback_query": {
+            "id": str(next(self.update_ids)), "from": self._user(uid), "chat_instance": str(uid), "data": data,
+            "message": {"message_id": next(self.update_ids), "date": int(time.time()),
+                        "chat": {"id": uid, "type": "private", "first_name": f"U{uid}"}, "text": "…"},
+        }})
+
+
+async def pair_flow(driver, rec, channel, i):
+    seller, buyer = 1_000_000 + i, 2_000_000 + i
+    item = f"Bench item {i}"
+    expiry = (datetime.date.today() + datetime.timedelta(days=30)).isoformat()
+
+    # Donation through the /newitem conversation
+    await driver.text(seller, "/newitem")
+    await driver.text(seller, item)
+    await driver.text(seller, "10")
+    await driver.text(seller, "M")
+    await driver.tap(seller, f"date_{expiry}")
+    await driver.text(seller, WARDS[i % len(WARDS)])
+    await driver.text(seller, "Skip")
+    await driver.tap(seller, "confirm_post")
+    listing_id = await rec.wait_for(
+        channel, lambda p: f"<b>{item}</b>" in json.dumps(p) and re.search(r"claim_(\d+)", json.dumps(p))
+    )
+    listing_id = listing_id.group(1)
+
+    # Claim through the deep link and private_message
+    await driver.text(buyer, f"/start claim_{listing_id}")
+    await driver.text(buyer, "2")
+    await driver.text(buyer, "tomorrow 10am")
+
+    if i % 2:
+        await driver.tap(seller, await rec.wait_for(seller, button_data("approve")))
+        return
+
+    # Suggest-time loop
+    await driver.tap(seller, await rec.wait_for(seller, button_data("suggest")))
+    await driver.tap(seller, await rec.wait_for(seller, button_data("date_")))
+    await driver.text(seller, "14:30")
+    await driver.tap(buyer, await rec.wait_for(buyer, button_data("accept_newtime")))
+
+
+def populate(main, n):
+    today = datetime.date.today()
+    for i in range(n):
+        expiry = today + datetime.timedelta(days=1 + i % 365)
+        qty = 1 + i % 20
+        listing_id = main.STORE.allocate_id()
+        main.STORE.add(listing_id, {
+            "poster_id": 10 + i % 500, "poster_name": f"poster{i % 500}",
+            "item": ITEMS[i % len(ITEMS)], "qty": qty, "remaining": qty,
+            "size": SIZES[i % len(SIZES)], "expiry": expiry.strftime("%d/%m/%y"),
+            "expiry_date": expiry.isoformat(), "location": WARDS[i % len(WARDS)],
+            "channel_msg_id": 100_000 + i, "kind": "text",
+        })
+    main.STORE.flush()
+    main.load_expiries()
+    main.load_search_index()
+
+
+async def run(listings, pairs, concurrency):
+    import main
+    from outbox import TokenBucket
+
+    rec = Recorder()
+    started = time.perf_counter()
+    populate(main, listings)
+    populate_seconds = time.perf_counter() - started
+
+    # Measure the bot, not Telegram's rate limits
+    main.OUTBOX.global_bucket = TokenBucket(1e9, 1e9)
+    main.OUTBOX.private_rate = main.OUTBOX.group_rate = 1e9
+
+    app = main.build_app(request=make_offline_request(rec))
+    driver = Driver(app)
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with gate:
+            await pair_flow(driver, rec, main.CHANNEL_ID, i)
+
+    async with app:
+        await app.post_init(app)
+        await app.start()
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(one(i) for i in range(pairs)))
+            elapsed = time.perf_counter() - started
+        finally:
+            await app.stop()
+            await app.post_shutdown(app)
+
+    lat = sorted(driver.latencies)
+    pct = lambda p: lat[min(len(lat) - 1, int(len(lat) * p))] * 1000
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{listings:>7,} listings | populate {populate_seconds:6.1f}s | "
+          f"{len(lat) / elapsed:7,.0f} updates/s | p50 {pct(0.5):6.2f} ms | p99 {pct(0.99):7.2f} ms | "
+          f"peak RSS {rss_mb:6.1f} MB | claims {main.STORE.claim_count():,}/{pairs:,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listings", type=int, help="pre-populated listings (default: 1k, 10k and 100k)")
+    parser.add_argument("--pairs", type=int, default=200, help="seller/buyer pairs to run")
+    parser.add_argument("--concurrency", type=int, default=50, help="pairs in flight at once")
+    args = parser.parse_args()
+
+    if args.listings is None:
+        # One process per scale so memory numbers don't bleed into each other
+        for n in (1_000, 10_000, 100_000):
+            subprocess.run([sys.executable, __file__, "--listings", str(n),
+                            "--pairs", str(args.pairs), "--concurrency", str(args.concurrency)], check=True)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_env(tmp)
+        asyncio.run(run(args.listings, args.pairs, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
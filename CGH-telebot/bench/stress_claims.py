@@ -0,0 +1,53 @@
+"""Fire hundreds of simultaneous approvals at one listing and check nothing is oversold.
+
+    python bench/stress_claims.py [approvals] [stock]
+
+Approvals run through asyncio.to_thread so they really do race on the store,
+the same way concurrent update handlers and the background writer do.
+"""
+
+import asyncio, sys, tempfile, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from storage import open_store, StoreWriter
+
+
+async def stress(spec, approvals, stock):
+    store = open_store(spec)
+    writer = StoreWriter(store, interval=0.01)
+    writer.start()
+    store.add(1, {
+        "poster_id": 1, "poster_name": "seller", "item": "Gloves", "qty": stock,
+        "remaining": stock, "size": "M", "expiry": "01/01/30", "location": "Ward 5",
+    })
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        asyncio.to_thread(store.reserve, 1, 1000 + i, 1 + i % 3, "today")
+        for i in range(approvals)
+    ))
+    elapsed = time.perf_counter() - started
+    await writer.stop()
+
+    granted = [r for r in results if r is not None]
+    claimed = sum(c["qty"] for c in store.claims(1))
+    remaining = store.get(1)["remaining"]
+    store.close()
+
+    assert remaining >= 0, f"oversold: remaining={remaining}"
+    assert claimed + remaining == stock, f"lost update: claimed={claimed} remaining={remaining}"
+    print(f"{spec.split(':')[0]:>6}: {len(granted)}/{approvals} approvals granted, "
+          f"{claimed} claimed, {remaining} left, {approvals / elapsed:,.0f} approvals/s")
+
+
+def main():
+    approvals = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    stock = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    with tempfile.TemporaryDirectory() as tmp:
+        for spec in (f"sqlite:{tmp}/stress.db", f"json:{tmp}/stress.json"):
+            asyncio.run(stress(spec, approvals, stock))
+
+
+if __name__ == "__main__":
+    main()
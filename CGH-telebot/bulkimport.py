@@ -0,0 +1,131 @@
+# ==============================
+# 📑 Bulk donation import
+# - CSV or XLSX sheets with one item per row
+# - Rows are read and validated one at a time
+# - Returns ready-to-store listings plus per-row errors
+# ==============================
+
+import csv, datetime, io
+
+import openpyxl
+
+# Accepted header names for each column (case-insensitive)
+COLUMNS = {
+    "item": ("item", "name", "description"),
+    "qty": ("qty", "quantity", "boxes", "units"),
+    "size": ("size",),
+    "expiry": ("expiry", "expiry date", "expires", "exp"),
+    "location": ("location", "pickup", "pickup location", "ward"),
+}
+REQUIRED = ("item", "qty", "expiry", "location")
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%y", "%d/%m/%Y", "%d-%m-%Y", "%d %b %Y", "%d %B %Y")
+
+
+class BulkImportError(Exception):
+    """The upload as a whole cannot be read (wrong type, missing columns, ...)."""
+
+
+def read_rows(fileobj, filename):
+    """Yield each row of a CSV or XLSX upload as a list of cell values, header first."""
+    name = filename.lower()
+    if name.endswith(".csv"):
+        yield from csv.reader(io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline=""))
+    elif name.endswith(".xlsx"):
+        try:
+            workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+        except Exception as e:
+            raise BulkImportError("Couldn't open that Excel file.") from e
+        try:
+            for row in workbook.active.iter_rows(values_only=True):
+                yield list(row)
+        finally:
+            workbook.close()
+    else:
+        raise BulkImportError("Please upload a .csv or .xlsx file.")
+
+
+def _header(row):
+    found = {}
+    for i, cell in enumerate(row):
+        label = str(cell or "").strip().lower()
+        for column, names in COLUMNS.items():
+            if label in names and column not in found:
+                found[column] = i
+    missing = [c for c in REQUIRED if c not in found]
+    if missing:
+        raise BulkImportError(f"Missing column(s): {', '.join(missing)}. "
+                              f"Expected a header row with: {', '.join(COLUMNS)}.")
+    return found
+
+
+def parse_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    text = str(value or "").strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_qty(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = str(value or "").strip()
+    return int(text) if text.isdigit() else None
+
+
+def parse_listings(fileobj, filename, today, max_rows=200):
+    """Validate an upload row by row. Returns ``(listings, errors)``.
+
+    ``listings`` are dicts with item, qty, size, expiry, expiry_date and
+    location; ``errors`` are human-readable messages naming the sheet row.
+    Blank rows are skipped. Reading stops after ``max_rows`` data rows.
+    """
+    try:
+        return _parse(read_rows(fileobj, filename), today, max_rows)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise BulkImportError("Couldn't read that CSV file; please save it as UTF-8 CSV.") from e
+
+
+def _parse(rows, today, max_rows):
+    header = None
+    listings, errors = [], []
+    for line, row in enumerate(rows, start=1):
+        if not any(str(c or "").strip() for c in row):
+            continue
+        if header is None:
+            header = _header(row)
+            continue
+        if len(listings) + len(errors) >= max_rows:
+            errors.append(f"Only the first {max_rows} rows were read.")
+            break
+        cell = lambda column: row[header[column]] if column in header and header[column] < len(row) else None
+
+        item = str(cell("item") or "").strip()
+        qty = parse_qty(cell("qty"))
+        expiry = parse_date(cell("expiry"))
+        location = str(cell("location") or "").strip()
+        size = str(cell("size") or "").strip() or "NA"
+        if not item:
+            errors.append(f"Row {line}: missing item")
+        elif not qty:
+            errors.append(f"Row {line}: quantity must be a whole number above 0")
+        elif expiry is None:
+            errors.append(f"Row {line}: unreadable expiry date {cell('expiry')!r}")
+        elif expiry < today:
+            errors.append(f"Row {line}: expiry {expiry:%d/%m/%y} is in the past")
+        elif not location:
+            errors.append(f"Row {line}: missing location")
+        else:
+            listings.append({
+                "item": item, "qty": qty, "size": size, "location": location,
+                "expiry": expiry.strftime("%d/%m/%y"), "expiry_date": expiry.isoformat(),
+            })
+    if header is None:
+        raise BulkImportError("The file is empty.")
+    return listings, errors
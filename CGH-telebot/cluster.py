@@ -0,0 +1,202 @@
+# ==============================
+# 🧩 Multi-instance mode
+# - One process holds a lease and fetches updates (getUpdates)
+# - Updates are sharded by user id into a shared inbox table
+# - Every process drains its own shard into its Application
+# ==============================
+
+import asyncio, json, logging, os, signal, socket, sqlite3, threading, time
+
+from telegram import Update
+from telegram.error import NetworkError
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    name       TEXT PRIMARY KEY,
+    holder     TEXT,
+    expires_at REAL NOT NULL DEFAULT 0,
+    next_offset INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS inbox (
+    update_id INTEGER PRIMARY KEY,
+    shard     INTEGER NOT NULL,
+    payload   TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_inbox_shard ON inbox(shard, update_id);
+"""
+
+
+def shard_of(update, shards):
+    """Shard for an update: by user, so one user's conversation stays in one process."""
+    user = update.effective_user
+    chat = update.effective_chat
+    key = user.id if user else chat.id if chat else 0
+    return key % shards
+
+
+class ClusterDB:
+    """Lease and inbox tables in a SQLite file shared by every process on the host.
+
+    All methods are blocking; call them through ``asyncio.to_thread``.
+    """
+
+    def __init__(self, path, lease="poller", holder=None, ttl=5.0):
+        self.lease = lease
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}"
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._db.execute("INSERT OR IGNORE INTO leases (name) VALUES (?)", (lease,))
+
+    def acquire(self):
+        """Take or renew the lease. Returns the next getUpdates offset if we hold it, else None."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "UPDATE leases SET holder=?, expires_at=? "
+                "WHERE name=? AND (holder=? OR expires_at < ?) RETURNING next_offset",
+                (self.holder, now + self.ttl, self.lease, self.holder, now)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def release(self):
+        with self._lock:
+            self._db.execute("UPDATE leases SET expires_at=0 WHERE name=? AND holder=?", (self.lease, self.holder))
+
+    def publish(self, rows, next_offset):
+        """Queue ``(update_id, shard, payload)`` rows and advance the offset, if still leader.
+
+        Both happen in one transaction fenced on the lease, so a leader that
+        lost its lease mid-poll cannot publish anything.
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                cur = self._db.execute(
+                    "UPDATE leases SET next_offset=? WHERE name=? AND holder=? AND expires_at >= ?",
+                    (next_offset, self.lease, self.holder, time.time())
+                )
+                if cur.rowcount != 1:
+                    self._db.execute("ROLLBACK")
+                    return False
+                self._db.executemany("INSERT OR IGNORE INTO inbox VALUES (?, ?, ?)", rows)
+                self._db.execute("COMMIT")
+                return True
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def take(self, shard, limit=100):
+        """Remove and return up to ``limit`` queued payloads for ``shard``, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "DELETE FROM inbox WHERE update_id IN "
+                "(SELECT update_id FROM inbox WHERE shard=? ORDER BY update_id LIMIT ?) "
+                "RETURNING update_id, payload",
+                (shard, limit)
+            ).fetchall()
+        return [payload for _, payload in sorted(rows)]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+async def _lead(app, cluster, shards, poll_timeout):
+    """Hold the lease when possible and, while holding it, fetch updates into the inbox."""
+    leader = False
+    failures = 0
+    while True:
+        try:
+            offset = await asyncio.to_thread(cluster.acquire)
+            if offset is None:
+                if leader:
+                    log.warning("🧩 Lost the polling lease")
+                leader = False
+                await asyncio.sleep(cluster.ttl / 5)
+                continue
+            if not leader:
+                log.info("🧩 %s is now polling for updates", cluster.holder)
+                await app.bot.delete_webhook()
+                leader = True
+            try:
+                updates = await app.bot.get_updates(
+                    offset=offset, timeout=poll_timeout, allowed_updates=Update.ALL_TYPES
+                )
+            except NetworkError as e:
+                log.warning("⚠️ getUpdates failed: %s", e)
+                await asyncio.sleep(1)
+                continue
+            if updates:
+                rows = [(u.update_id, shard_of(u, shards), u.to_json()) for u in updates]
+                await asyncio.to_thread(cluster.publish, rows, updates[-1].update_id + 1)
+            failures = 0
+        except Exception:
+            # Conflict, InvalidToken, a locked database...: log, back off and keep going
+            failures += 1
+            log.exception("⚠️ Polling loop failed")
+            await asyncio.sleep(min(2 ** failures, 30))
+
+
+async def _work(app, cluster, shard, interval):
+    """Feed this process's shard of the inbox into the Application."""
+    failures = 0
+    while True:
+        try:
+            payloads = await asyncio.to_thread(cluster.take, shard)
+            failures = 0
+        except Exception:
+            failures += 1
+            log.exception("⚠️ Reading the inbox failed")
+            await asyncio.sleep(min(2 ** failures, 30))
+            continue
+        for payload in payloads:
+            # The rows are already taken, so one bad payload must not lose the rest of the batch
+            try:
+                update = Update.de_json(json.loads(payload), app.bot)
+            except Exception:
+                log.exception("⚠️ Dropping an unreadable update")
+                continue
+            await app.update_queue.put(update)
+        if not payloads:
+            await asyncio.sleep(interval)
+
+
+async def run_cluster(app, db_path, shard, shards, ttl=5.0, poll_interval=0.1):
+    """Run ``app`` as one member of a cluster until SIGINT/SIGTERM.
+
+    Every member competes for the polling lease (TTL ``ttl`` seconds, renewed
+    between long polls of ``ttl / 2``), so a dead leader is replaced within
+    about ``ttl`` seconds. Like ``run_polling`` this runs post_init/post_shutdown.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    cluster = ClusterDB(db_path, ttl=ttl)
+    async with app:
+        if app.post_init:
+            await app.post_init(app)
+        await app.start()
+        log.info("🧩 %s serving shard %d of %d", cluster.holder, shard, shards)
+        tasks = [
+            asyncio.create_task(_lead(app, cluster, shards, poll_timeout=int(ttl / 2))),
+            asyncio.create_task(_work(app, cluster, shard, poll_interval)),
+        ]
+        try:
+            await stop.wait()
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await asyncio.to_thread(cluster.release)
+            cluster.close()
+            await app.stop()
+            if app.post_shutdown:
+                await app.post_shutdown(app)
@@ -0,0 +1,165 @@
+# ==============================
+# 🧊 Cold tier for archived listings
+# - Append-only, compressed JSONL segment files
+# - One compressed member per record, so any record can be read on its own
+# - Offsets live in the hot store's cold_index table
+# ==============================
+
+import gzip, io, json, logging, os, re, threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:  # optional; gzip is always available
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; run a single mover process there
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+_SEGMENT = re.compile(r"^seg-(\d+)\.jsonl\.(gz|zst)$")
+
+
+def _compress(data, codec):
+    if codec == "zst":
+        return zstandard.ZstdCompressor().compress(data)
+    return gzip.compress(data, mtime=0)
+
+
+def _decompress(data, codec):
+    if codec == "zst":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class Segments:
+    """A directory of append-only segment files.
+
+    Every record is compressed on its own and appended to the newest segment.
+    A segment is still a valid ``.jsonl.gz`` / ``.jsonl.zst`` stream (gzip
+    members and zstd frames may be concatenated), so ``zcat`` and ``scan``
+    read it front to back, while ``read`` jumps straight to one record.
+    """
+
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, codec=None):
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.codec = codec or ("zst" if zstandard else "gz")
+        self._lock = threading.Lock()
+
+    def _segments(self):
+        if not self.directory.exists():
+            return []
+        found = (_SEGMENT.match(p.name) for p in self.directory.iterdir())
+        return sorted((int(m.group(1)), m.group(0)) for m in found if m)
+
+    def _current(self):
+        segments = self._segments()
+        if segments:
+            number, name = segments[-1]
+            path = self.directory / name
+            if name.endswith(self.codec) and path.stat().st_size < self.segment_bytes:
+                return name
+            number += 1
+        else:
+            number = 1
+        return f"seg-{number:06d}.jsonl.{self.codec}"
+
+    @contextmanager
+    def exclusive(self):
+        """Try to take the directory's cross-process lock. Yields False if another process holds it."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / ".lock", "a") as f:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    yield False
+                    return
+            # Closing the file releases the lock
+            yield True
+
+    def append(self, records):
+        """Append ``records`` (dicts) durably. Returns ``(segment, position, length)`` for each."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        locations = []
+        with self._lock:
+            name = self._current()
+            with open(self.directory / name, "ab") as f:
+                position = f.seek(0, io.SEEK_END)
+                for record in records:
+                    line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+                    blob = _compress(line.encode(), self.codec)
+                    f.write(blob)
+                    locations.append((name, position, len(blob)))
+                    position += len(blob)
+                f.flush()
+                os.fsync(f.fileno())
+        return locations
+
+    def read(self, segment, position, length):
+        with open(self.directory / segment, "rb") as f:
+            f.seek(position)
+            data = f.read(length)
+        return json.loads(_decompress(data, segment.rsplit(".", 1)[1]))
+
+    def scan(self):
+        """Every record in every segment, oldest first."""
+        for _, name in self._segments():
+            with open(self.directory / name, "rb") as f:
+                if name.endswith(".zst"):
+                    stream = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+                else:
+                    stream = gzip.GzipFile(fileobj=f)
+                for line in io.TextIOWrapper(stream, encoding="utf-8"):
+                    yield json.loads(line)
+
+
+class ColdTier:
+    """Moves archived listings out of the hot store and looks them up again on demand.
+
+    Nothing is loaded up front: ``get`` costs one index lookup in the hot
+    store plus one seek and one decompression.
+    """
+
+    def __init__(self, store, directory, **kwargs):
+        self.store = store
+        self.segments = Segments(directory, **kwargs)
+
+    def get(self, listing_id):
+        location = self.store.cold_location(listing_id)
+        if location is None:
+            return None
+        return self.segments.read(*location)
+
+    def scan(self):
+        return self.segments.scan()
+
+    def move(self, archived_before, batch=500):
+        """Move listings archived before ``archived_before`` (and their claims). Returns the count.
+
+        Records are fsynced to a segment before the hot rows are deleted, so
+        a crash in between only leaves an unreferenced copy in the segment.
+
+        In cluster mode every process runs the mover; the segment directory's
+        lock lets one of them select, append and index at a time, and the
+        others skip the run.
+        """
+        moved = 0
+        with self.segments.exclusive() as acquired:
+            if not acquired:
+                log.debug("🧊 Another process is moving listings to the cold tier")
+                return 0
+            while True:
+                listings = self.store.cold_candidates(archived_before, batch)
+                if not listings:
+                    return moved
+                locations = self.segments.append(listings)
+                self.store.move_to_cold([(l["id"], *loc, len(l["claims"])) for l, loc in zip(listings, locations)])
+                self.store.flush()
+                moved += len(listings)
+                log.info("🧊 Moved %d archived listings to %s", len(listings), locations[-1][0])
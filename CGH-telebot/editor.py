@@ -0,0 +1,85 @@
+# ==============================
+# ✏️ Debounced channel post editor
+# - Keeps only the latest wanted state per message
+# - One edit per debounce window
+# - Skips edits that would not change anything
+# ==============================
+
+import asyncio, logging
+
+log = logging.getLogger(__name__)
+
+
+class EditScheduler:
+    """Coalesce bursts of edit requests for the same message.
+
+    ``request(key, render, send)`` asks for ``key`` to be refreshed. After
+    ``delay`` seconds the most recent ``render`` is called to build the wanted
+    state, and ``send(state)`` is awaited only if that state differs from the
+    last one sent for ``key``. Earlier requests in the same window are dropped.
+    A request made while an edit of ``key`` is being sent waits for it and
+    then starts a new window, so edits of one message never overtake each other.
+    """
+
+    def __init__(self, delay=3.0):
+        self.delay = delay
+        self.requested = 0
+        self.sent = 0
+        self.skipped = 0
+        self._pending = {}
+        self._timers = {}
+        self._sending = {}  # key -> task awaiting its send
+        self._last = {}
+
+    def request(self, key, render, send):
+        self.requested += 1
+        self._pending[key] = (render, send)
+        # While an edit of this key is in flight, the request waits for it to finish
+        if key not in self._timers and key not in self._sending:
+            self._schedule(key)
+
+    def _schedule(self, key):
+        self._timers[key] = asyncio.get_running_loop().call_later(
+            self.delay, lambda: asyncio.create_task(self._flush(key))
+        )
+
+    def forget(self, key):
+        """Drop the remembered state for a message that will not change again."""
+        self._last.pop(key, None)
+
+    def mark_sent(self, key, state):
+        """Record that ``state`` is already on screen for ``key``, e.g. after posting it afresh."""
+        self._last[key] = state
+
+    async def _flush(self, key):
+        self._timers.pop(key, None)
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        render, send = pending
+        state = render()
+        if state is None or state == self._last.get(key):
+            self.skipped += 1
+            return
+        self._last[key] = state
+        # One edit per message at a time: two in the outbox could land out of order
+        self._sending[key] = asyncio.current_task()
+        try:
+            await send(state)
+            self.sent += 1
+        except Exception:
+            self._last.pop(key, None)
+            log.exception("⚠️ Error updating post %s", key)
+        finally:
+            del self._sending[key]
+            if key in self._pending:
+                self._schedule(key)
+
+    async def flush_all(self):
+        """Send every pending edit now, e.g. on shutdown."""
+        while self._timers or self._sending:
+            await asyncio.gather(*self._sending.values(), return_exceptions=True)
+            for timer in self._timers.values():
+                timer.cancel()
+            keys = list(self._timers)
+            await asyncio.gather(*(self._flush(k) for k in keys))
@@ -0,0 +1,45 @@
+# ==============================
+# ⌛ Expiry index
+# - Min-heap of (expiry date, listing id)
+# - Sweeps pop only the listings that are due
+# ==============================
+
+import datetime, heapq
+
+
+class ExpiryIndex:
+    """Min-heap of active listings ordered by expiry date.
+
+    ``pop_due(today)`` pops every listing whose expiry date is before
+    ``today`` in O(k log n). Entries are never removed early: listings that
+    get claimed out or closed stay in the heap and the caller skips them when
+    they come due.
+    """
+
+    def __init__(self):
+        self._heap = []
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, listing_id, expiry_date):
+        if isinstance(expiry_date, str):
+            expiry_date = datetime.date.fromisoformat(expiry_date)
+        heapq.heappush(self._heap, (expiry_date, listing_id))
+
+    def load(self, entries):
+        """Bulk-build from ``(listing_id, expiry_date)`` pairs in O(n)."""
+        self._heap = [
+            (datetime.date.fromisoformat(d) if isinstance(d, str) else d, listing_id)
+            for listing_id, d in entries
+        ]
+        heapq.heapify(self._heap)
+
+    def next_due(self):
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, today):
+        due = []
+        while self._heap and self._heap[0][0] < today:
+            due.append(heapq.heappop(self._heap)[1])
+        return due
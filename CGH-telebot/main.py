@@ -1,6 +1,6 @@
 # ==============================
 # 🏥 Sustainability Redistribution Bot (FINAL)
-# - Persistent JSON listings
+# - Persistent SQLite listings
 # - Calendar date selector
 # - Manual pickup time
 # - Live Remaining counter
@@ -8,60 +8,205 @@
 # ==============================
 
 from telegram import (
-    Update, InlineKeyboardButton, InlineKeyboardMarkup, BotCommand
+    Update, InlineKeyboardButton, InlineKeyboardMarkup, BotCommand, InputMediaPhoto, LinkPreviewOptions
 )
+from telegram.error import BadRequest, Forbidden
 from telegram.ext import (
     Application, CommandHandler, MessageHandler,
     CallbackQueryHandler, ConversationHandler,
     ContextTypes, filters
 )
-import os, datetime, calendar, json
+import os, io, csv, asyncio, datetime, calendar, functools, html, logging, tempfile, time
+from collections import defaultdict
 from pathlib import Path
 
+from storage import open_store, snapshot_path, SQLiteListingStore, StoreWriter
+from editor import EditScheduler
+from outbox import Outbox, PRIORITY_CHANNEL, PRIORITY_BULK
+from webhook import run_webhook
+from processor import PerUserUpdateProcessor
+from cluster import run_cluster
+from persistence import SQLitePersistence
+from expiry import ExpiryIndex
+from search import SearchIndex, tokenize
+from subscriptions import SubscriptionIndex
+from coldtier import ColdTier
+from tokens import TokenStore, MISSING, EXPIRED, USED, CLAIM, PROPOSAL
+from bulkimport import BulkImportError, parse_listings
+from metrics import (
+    REGISTRY, FLUSH_SECONDS, OUTBOX_WAIT_SECONDS, InstrumentedRequest, timed,
+    start_metrics_server, configure_logging
+)
+
 # ========= CONFIG =========
 BOT_TOKEN = os.getenv("BOT_TOKEN", "8377427445:AAE-H_EiGAjs4NKE20v9S8zFLOv2AiHKcpU")
 CHANNEL_ID = os.getenv("CHANNEL_ID", "@sustainability_redistribution")
-
-ITEM, QTY, SIZE, EXPIRY, LOCATION, PHOTO, CONFIRM, SUGGEST = range(8)
+# Webhook mode is used when WEBHOOK_URL is set, long polling otherwise
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+# Point at a local Bot API server (e.g. bench/fake_botapi.py) for load tests
+BOT_API_URL = os.getenv("BOT_API_URL")
+# Prometheus metrics on 127.0.0.1:METRICS_PORT when set; LOG_JSON=1 for JSON logs
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+LOG_JSON = os.getenv("LOG_JSON", "") not in ("", "0")
+# Telegram user ids allowed to /export the claim history (comma-separated)
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip()}
+# Digest mode: new listings and completions go out as one channel message every
+# DIGEST_MINUTES instead of one post each (0 = off)
+DIGEST_MINUTES = float(os.getenv("DIGEST_MINUTES", "0"))
+# Cluster mode: run CLUSTER_SHARDS processes against the same SQLite files, each
+# with its own CLUSTER_SHARD (0..CLUSTER_SHARDS-1). One of them polls for everyone.
+CLUSTER_SHARDS = int(os.getenv("CLUSTER_SHARDS", "0"))
+CLUSTER_SHARD = int(os.getenv("CLUSTER_SHARD", "0"))
+CLUSTER_DB = os.getenv("CLUSTER_DB", "cluster.db")
+
+log = logging.getLogger("bot")
+
+ITEM, QTY, SIZE, EXPIRY, LOCATION, PHOTO, CONFIRM, SUGGEST, BULK_FILE, BULK_CONFIRM = range(10)
 
 # ========= STORAGE =========
-STORE = Path("listings.json")
-LISTINGS = {}
+STORE = open_store(os.getenv("LISTING_STORE", "sqlite:listings.db"), shared=bool(CLUSTER_SHARDS))
+WRITER = StoreWriter(STORE, interval=float(os.getenv("FLUSH_INTERVAL", "1.0")))
+LEGACY_STORE = Path("listings.json")
 
-def load_listings():
-    global LISTINGS
-    if STORE.exists():
-        try:
-            data = json.loads(STORE.read_text())
-            LISTINGS.update({int(k): v for k, v in data.items()})
-            print(f"📦 Loaded {len(LISTINGS)} listings.")
-        except Exception as e:
-            print("⚠️ Failed to load listings:", e)
+# Archived listings move to compressed segments after COLD_AFTER_DAYS and are
+# only read back when an old claim link is opened or a report scans them
+COLD = ColdTier(STORE, os.getenv("COLD_DIR", "archive")) if isinstance(STORE, SQLiteListingStore) else None
+COLD_AFTER_DAYS = int(os.getenv("COLD_AFTER_DAYS", "7"))
+
+# Active listings by expiry date, so the sweeper only touches the due ones
+EXPIRIES = ExpiryIndex()
+# Active listings by item/size/location words, for /browse and /search
+SEARCH = SearchIndex()
 
-def save_listings():
+def load_listings():
+    """Import the legacy listings.json (or the JSON store's snapshot of it) into an empty store on first run."""
+    legacy = LEGACY_STORE.exists() or snapshot_path(LEGACY_STORE).exists()
+    if STORE.count() or not isinstance(STORE, SQLiteListingStore) or not legacy:
+        log.info("📦 %d listings in store.", STORE.count())
+        return
     try:
-        json.dump({str(k): v for k, v in LISTINGS.items()}, STORE.open("w"))
-    except Exception as e:
-        print("⚠️ Failed to save listings:", e)
+        n = STORE.import_json(LEGACY_STORE)
+        STORE.flush()
+        log.info("📦 Imported %d listings from %s.", n, LEGACY_STORE)
+    except Exception:
+        log.exception("⚠️ Failed to import listings")
+
+
+def load_expiries():
+    EXPIRIES.load(STORE.active_expiries())
+    log.info("⌛ Tracking expiry of %d listings.", len(EXPIRIES))
+
+
+def load_search_index():
+    for l in STORE.active_listings():
+        SEARCH.add(l["id"], l["item"], l["size"], l["location"])
+    log.info("🔎 Indexed %d active listings.", len(SEARCH))
+
+
+def find_listing(listing_id):
+    """A listing from the store, or from the cold tier if it was archived long ago."""
+    l = STORE.get(listing_id)
+    if l is None and COLD is not None:
+        l = COLD.get(listing_id)
+    return l
+
+
+async def move_to_cold(context: ContextTypes.DEFAULT_TYPE):
+    """Move listings archived more than COLD_AFTER_DAYS ago out of the hot store."""
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=COLD_AFTER_DAYS)
+    await asyncio.to_thread(COLD.move, cutoff)
+
+
+async def purge_tokens(context: ContextTypes.DEFAULT_TYPE):
+    """Drop claim and proposal tokens past their TTL."""
+    await asyncio.to_thread(TOKENS.purge)
+
+
+async def resync_indexes(context: ContextTypes.DEFAULT_TYPE):
+    """Cluster mode: pick up listings posted or archived by the other processes."""
+    active = {l["id"]: l for l in await asyncio.to_thread(STORE.active_listings)}
+    for listing_id in list(SEARCH.search()):
+        if listing_id not in active:
+            SEARCH.remove(listing_id)
+    for listing_id, l in active.items():
+        if listing_id not in SEARCH:
+            SEARCH.add(listing_id, l["item"], l["size"], l["location"])
+    EXPIRIES.load(await asyncio.to_thread(STORE.active_expiries))
+
+
+# Channel post edits are debounced so a burst of approvals costs one edit.
+EDITOR = EditScheduler(delay=float(os.getenv("CHANNEL_EDIT_DELAY", "3.0")))
+
+# Claim and proposal buttons carry a short token; the request itself stays server-side
+TOKENS = TokenStore(os.getenv("STATE_DB", "state.db"), ttl=float(os.getenv("CLAIM_TTL_HOURS", "72")) * 3600)
+TOKEN_ERRORS = {
+    MISSING: "⚠️ This request is no longer valid.",
+    EXPIRED: "⌛ This request has expired. The buyer can claim again from the channel.",
+}
+
+# "/subscribe gloves M" alerts; shared between cluster processes through the state DB
+SUBS = SubscriptionIndex(os.getenv("STATE_DB", "state.db"))
+
+# Every send/edit goes through the outbox, which rate-limits and retries.
+# In cluster mode the bot-wide budget is split between the processes.
+OUTBOX = Outbox(global_rate=float(os.getenv("OUTBOX_GLOBAL_RATE", "25")) / max(CLUSTER_SHARDS, 1))
+
+
+# ========= METRICS =========
+WRITER.on_flush = FLUSH_SECONDS.observe
+OUTBOX.on_wait = OUTBOX_WAIT_SECONDS.observe
+REGISTRY.gauge("listings_total", "Listings in the store", fn=STORE.count)
+REGISTRY.gauge("listings_active", "Listings with stock left", fn=lambda: len(SEARCH))
+REGISTRY.counter("claims_total", "Approved claims", fn=STORE.claim_count)
+REGISTRY.gauge("store_pending_writes", "Listing writes waiting for the next flush", fn=lambda: WRITER.queue_depth)
+REGISTRY.gauge("subscriptions_total", "Listing alert subscriptions", fn=lambda: len(SUBS))
+REGISTRY.gauge("callback_tokens_cached", "Claim/proposal tokens held in memory", fn=lambda: len(TOKENS))
+REGISTRY.gauge("outbox_queue_depth", "Outbound messages waiting to be sent", fn=lambda: OUTBOX.queue_depth)
+REGISTRY.counter("outbox_sent_total", "Outbound messages sent", fn=lambda: OUTBOX.sent)
+REGISTRY.counter("outbox_retries_total", "Outbound messages retried", fn=lambda: OUTBOX.retried)
+REGISTRY.counter("outbox_dropped_total", "Outbound messages dropped", fn=lambda: OUTBOX.dropped)
+REGISTRY.counter("channel_edits_sent_total", "Channel post edits sent", fn=lambda: EDITOR.sent)
+REGISTRY.counter("channel_edits_skipped_total", "Channel post edits skipped as unchanged", fn=lambda: EDITOR.skipped)
 
 
 # ========= CALENDAR =========
-def make_month_calendar(year=None, month=None):
+_calendar_day = None
+
+def make_month_calendar(year=None, month=None, grey_past=True):
+    """Month picker keyboard. Past days are greyed out unless grey_past=False.
+
+    Rendered keyboards are cached per (year, month, today); the cache is
+    dropped when the date rolls over at midnight.
+    """
+    global _calendar_day
     today = datetime.date.today()
+    if today != _calendar_day:
+        _render_month_calendar.cache_clear()
+        _calendar_day = today
     if year is None:
         year = today.year
     if month is None:
         month = today.month
+    return _render_month_calendar(year, month, today, grey_past)
+
+
+@functools.lru_cache(maxsize=256)
+def _render_month_calendar(year, month, today, grey_past):
     month_name = datetime.date(year, month, 1).strftime("%B %Y")
     cal = calendar.Calendar()
     days = [d for d in cal.itermonthdates(year, month)]
 
     rows, row = [], []
     for day in days:
-        if day.month == month:
-            row.append(InlineKeyboardButton(str(day.day), callback_data=f"date_{day.isoformat()}"))
-        else:
+        if day.month != month:
             row.append(InlineKeyboardButton(" ", callback_data="noop"))
+        elif grey_past and day < today:
+            row.append(InlineKeyboardButton("·", callback_data="noop"))
+        else:
+            row.append(InlineKeyboardButton(str(day.day), callback_data=f"date_{day.isoformat()}"))
         if len(row) == 7:
             rows.append(row)
             row = []
@@ -83,88 +228,267 @@ def make_month_calendar(year=None, month=None):
 
 
 # ========= UPDATE CHANNEL POST =========
-async def update_channel_post(context: ContextTypes.DEFAULT_TYPE, msg_id: int):
-    """Update or archive the channel post correctly for both text and photo messages."""
-    l = LISTINGS.get(msg_id)
-    if not l:
-        return
-
-    try:
-        # Build new message text
-        if l["remaining"] <= 0:
-            text = (
-                f"🧾 <b>{l['item']}</b>\n"
-                f"✅ <b>Fully Claimed</b>\n"
-                f"📏 Size: {l['size']}\n"
-                f"⏰ Expiry: {l['expiry']}\n"
-                f"📍 {l['location']}"
-            )
-
-            # Try editing caption first (photo posts)
-            try:
-                await context.bot.edit_message_caption(
-                    chat_id=CHANNEL_ID,
-                    message_id=msg_id,
-                    caption=text,
-                    parse_mode="HTML"
-                )
-            except Exception:
-                # If message has no caption (text-only), edit text
-                await context.bot.edit_message_text(
-                    chat_id=CHANNEL_ID,
-                    message_id=msg_id,
-                    text=text,
-                    parse_mode="HTML"
-                )
-
-            # Send broadcast + notify seller
-            await context.bot.send_message(
-                CHANNEL_ID,
-                f"✅ <b>{l['item']}</b> is now fully claimed! 🎉\nThank you for participating ♻️",
-                parse_mode="HTML"
-            )
-            await context.bot.send_message(
-                l["poster_id"],
-                f"✅ Your item <b>{l['item']}</b> has been fully claimed and archived.",
-                parse_mode="HTML"
-            )
-            return
+def render_channel_post(l, bot_username):
+    """Build the (text, keyboard) a listing's channel post should show."""
+    if l["remaining"] > 0 and l["archived"]:
+        text = (
+            f"🧾 <b>{l['item']}</b>\n"
+            f"{'⌛ <b>Expired</b>' if is_expired(l) else '🚫 <b>Closed</b>'}\n"
+            f"📏 Size: {l['size']}\n"
+            f"⏰ Expiry: {l['expiry']}\n"
+            f"📍 {l['location']}"
+        )
+        return text, None
 
-        # Item still available → show remaining quantity
+    if l["remaining"] <= 0:
         text = (
             f"🧾 <b>{l['item']}</b>\n"
-            f"📦 Remaining: {l['remaining']} of {l['qty']}\n"
+            f"✅ <b>Fully Claimed</b>\n"
             f"📏 Size: {l['size']}\n"
             f"⏰ Expiry: {l['expiry']}\n"
             f"📍 {l['location']}"
         )
-        keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("🤝 Claim", url=f"https://t.me/{context.bot.username}?start=claim_{msg_id}")]
-        ])
+        return text, None
+
+    # Item still available → show remaining quantity
+    text = (
+        f"🧾 <b>{l['item']}</b>\n"
+        f"📦 Remaining: {l['remaining']} of {l['qty']}\n"
+        f"📏 Size: {l['size']}\n"
+        f"⏰ Expiry: {l['expiry']}\n"
+        f"📍 {l['location']}"
+    )
+    if l["kind"] == "album":
+        # Media groups can't carry buttons, so the claim link goes in the caption
+        return text + album_claim_link(bot_username, l["id"]), None
+    keyboard = InlineKeyboardMarkup([
+        [InlineKeyboardButton("🤝 Claim", url=f"https://t.me/{bot_username}?start=claim_{l['id']}")]
+    ])
+    return text, keyboard
+
 
-        # Again — prefer editing caption first
+def album_claim_link(bot_username, listing_id):
+    return f"\n\n<a href=\"https://t.me/{bot_username}?start=claim_{listing_id}\">🤝 Claim</a>"
+
+
+async def edit_channel_post(l, text, keyboard):
+    """Edit a listing's channel post with the one call that matches its kind."""
+    kwargs = dict(message_id=l["channel_msg_id"], reply_markup=keyboard, parse_mode="HTML")
+    if l["kind"] in ("photo", "album"):
+        # An album's caption lives on its first message, which is the listing's channel_msg_id
+        await OUTBOX.submit(CHANNEL_ID, "edit_message_caption", priority=PRIORITY_CHANNEL, caption=text, **kwargs)
+    elif l["kind"] == "text":
+        await OUTBOX.submit(CHANNEL_ID, "edit_message_text", priority=PRIORITY_CHANNEL, text=text, **kwargs)
+    else:
+        # Listings posted before the kind was stored: find out once, then remember it
         try:
-            await context.bot.edit_message_caption(
-                chat_id=CHANNEL_ID,
-                message_id=msg_id,
-                caption=text,
-                reply_markup=keyboard,
-                parse_mode="HTML"
-            )
+            await OUTBOX.submit(CHANNEL_ID, "edit_message_caption", priority=PRIORITY_CHANNEL, caption=text, **kwargs)
+            STORE.update(l["id"], kind="photo")
         except Exception:
-            await context.bot.edit_message_text(
-                chat_id=CHANNEL_ID,
-                message_id=msg_id,
-                text=text,
-                reply_markup=keyboard,
+            await OUTBOX.submit(CHANNEL_ID, "edit_message_text", priority=PRIORITY_CHANNEL, text=text, **kwargs)
+            STORE.update(l["id"], kind="text")
+
+
+def refresh_channel_post(bot, listing_id):
+    """Queue a debounced refresh of a listing's channel post."""
+    l = STORE.get(listing_id)
+    if l and l["kind"] == "digest":
+        # Not yet in a digest (None), or being published right now (0)
+        if l["channel_msg_id"]:
+            refresh_digest(bot, l["channel_msg_id"])
+        return
+    if l and l["channel_msg_id"] is None:
+        # Stored but not posted yet; post_batch posts its current state
+        return
+
+    def render():
+        current = STORE.get(listing_id)
+        return render_channel_post(current, bot.username) if current else None
+
+    async def send(state):
+        l = STORE.get(listing_id)
+        await edit_channel_post(l, *state)
+        if l["archived"] or l["remaining"] <= 0:
+            # Archived posts never change again
+            EDITOR.forget(listing_id)
+
+    EDITOR.request(listing_id, render, send)
+
+
+def archive_listing(bot, l, reason="claimed"):
+    """Archive a fully claimed or expired listing and tell everyone, exactly once.
+
+    Only the first caller wins the archive flag, so however many approvals
+    (or sweeps) race here the broadcast and poster notice go out once.
+    """
+    if not STORE.mark_archived(l["id"]):
+        return False
+    SEARCH.remove(l["id"])
+    refresh_channel_post(bot, l["id"])
+    if reason == "claimed":
+        if DIGEST_MINUTES:
+            DIGEST_COMPLETED.append(l["item"])
+        else:
+            OUTBOX.send(
+                CHANNEL_ID, "send_message", priority=PRIORITY_CHANNEL,
+                text=f"✅ <b>{l['item']}</b> is now fully claimed! 🎉\nThank you for participating ♻️",
                 parse_mode="HTML"
             )
+        OUTBOX.send(
+            l["poster_id"], "send_message",
+            text=f"✅ Your item <b>{l['item']}</b> has been fully claimed and archived.",
+            parse_mode="HTML"
+        )
+    elif l["remaining"] > 0:
+        # Nothing to tell the donor about an expired listing that had already run out
+        OUTBOX.send(
+            l["poster_id"], "send_message",
+            text=f"⌛ Your item <b>{l['item']}</b> expired on {l['expiry']} and has been archived "
+                 f"({l['remaining']} of {l['qty']} unclaimed).",
+            parse_mode="HTML"
+        )
+    return True
+
+
+async def update_channel_post(context: ContextTypes.DEFAULT_TYPE, listing_id: int):
+    """Queue a debounced refresh of the channel post and archive it once fully claimed."""
+    l = STORE.get(listing_id)
+    if not l:
+        return
+    refresh_channel_post(context.bot, listing_id)
+    if l["remaining"] <= 0:
+        archive_listing(context.bot, l, "claimed")
+
+
+# ========= CHANNEL DIGEST =========
+DIGEST_PAGE_SIZE = 10
+DIGEST_PAGES = {}      # digest message id -> page currently shown
+DIGEST_NOTES = {}      # digest message id -> "fully claimed" footer it was published with
+DIGEST_COMPLETED = []  # items fully claimed since the last digest
+NO_PREVIEW = LinkPreviewOptions(is_disabled=True)
+
+
+def render_digest(listings, page, bot_username, note=None):
+    """One page of a digest message as (text, keyboard); every line has its own claim link."""
+    pages = max(1, -(-len(listings) // DIGEST_PAGE_SIZE))
+    page = min(max(page, 0), pages - 1)
+    lines = []
+    for n, l in enumerate(listings[page * DIGEST_PAGE_SIZE:(page + 1) * DIGEST_PAGE_SIZE],
+                          start=page * DIGEST_PAGE_SIZE + 1):
+        item = html.escape(l["item"])
+        if l["remaining"] <= 0:
+            lines.append(f"{n}. <s>{item}</s> · ✅ Fully claimed")
+        elif l["archived"] or is_expired(l):
+            lines.append(f"{n}. <s>{item}</s> · ⌛ Expired")
+        else:
+            link = f"https://t.me/{bot_username}?start=claim_{l['id']}"
+            lines.append(
+                f"{n}. <b>{item}</b> ({html.escape(l['size'] or 'NA')}) · {l['remaining']} of {l['qty']} left · "
+                f"⏰ {l['expiry']} · 📍 {html.escape(l['location'] or '')} · <a href=\"{link}\">Claim</a>"
+            )
+    parts = []
+    if listings:
+        heading = "🧾 <b>New donations</b>"
+        if pages > 1:
+            heading += f" · page {page + 1}/{pages}"
+        parts.append(heading + "\n\n" + "\n".join(lines))
+    if note:
+        parts.append(note)
+
+    keyboard = None
+    if pages > 1:
+        nav = []
+        if page > 0:
+            nav.append(InlineKeyboardButton("<<", callback_data=f"digest|{page - 1}"))
+        nav.append(InlineKeyboardButton(f"{page + 1}/{pages}", callback_data="noop"))
+        if page < pages - 1:
+            nav.append(InlineKeyboardButton(">>", callback_data=f"digest|{page + 1}"))
+        keyboard = InlineKeyboardMarkup([nav])
+    return "\n\n".join(parts), keyboard
+
+
+def render_digest_message(bot_username, message_id):
+    return render_digest(STORE.digest_listings(message_id), DIGEST_PAGES.get(message_id, 0),
+                         bot_username, DIGEST_NOTES.get(message_id))
+
+
+def refresh_digest(bot, message_id):
+    """Queue a debounced re-render of a digest message after stock changed."""
+    async def send(state):
+        text, keyboard = state
+        await OUTBOX.submit(CHANNEL_ID, "edit_message_text", priority=PRIORITY_CHANNEL, message_id=message_id,
+                            text=text, reply_markup=keyboard, parse_mode="HTML", link_preview_options=NO_PREVIEW)
+
+    EDITOR.request(("digest", message_id), lambda: render_digest_message(bot.username, message_id), send)
+
+
+async def publish_digest(context: ContextTypes.DEFAULT_TYPE):
+    """Send everything gathered since the last run as one channel message."""
+    ids = await asyncio.to_thread(STORE.take_digest_batch)
+    completed = DIGEST_COMPLETED[:]
+    DIGEST_COMPLETED.clear()
+    if not ids and not completed:
+        return
+
+    note = None
+    if completed:
+        names = ", ".join(html.escape(item) for item in completed[:10])
+        if len(completed) > 10:
+            names += f" and {len(completed) - 10} more"
+        note = f"✅ <b>Fully claimed since the last digest:</b> {names} 🎉"
+    text, keyboard = render_digest([STORE.get(i) for i in ids], 0, context.bot.username, note)
+    try:
+        msg = await OUTBOX.submit(CHANNEL_ID, "send_message", priority=PRIORITY_CHANNEL, text=text,
+                                  reply_markup=keyboard, parse_mode="HTML", link_preview_options=NO_PREVIEW)
+    except Exception:
+        log.exception("⚠️ Failed to publish the channel digest")
+        for listing_id in ids:
+            STORE.update(listing_id, channel_msg_id=None)
+        DIGEST_COMPLETED[:0] = completed
+        return
+
+    for listing_id in ids:
+        STORE.update(listing_id, channel_msg_id=msg.message_id)
+    if note:
+        DIGEST_NOTES[msg.message_id] = note
+        # Kept in bot_data so re-renders after a restart still show it
+        context.bot_data["digest_notes"] = dict(list(DIGEST_NOTES.items())[-50:])
+    log.info("📰 Published a digest with %d listings and %d completions", len(ids), len(completed))
+
+
+@timed
+async def digest_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Flip a digest message to another page (the page is shared by everyone viewing it)."""
+    q = update.callback_query
+    await q.answer()
+    message_id = q.message.message_id
+    DIGEST_PAGES[message_id] = int(q.data.split("|")[1])
+    text, keyboard = render_digest_message(context.bot.username, message_id)
+    try:
+        await q.edit_message_text(text, reply_markup=keyboard, parse_mode="HTML", link_preview_options=NO_PREVIEW)
+    except BadRequest:
+        pass  # e.g. two taps on the same page: "message is not modified"
+    # The scheduler's last-sent state no longer matches what the message shows
+    EDITOR.forget(("digest", message_id))
+
 
-    except Exception as e:
-        print(f"⚠️ Error updating post: {e}")
+# ========= EXPIRY SWEEPER =========
+def is_expired(l, today=None):
+    return bool(l["expiry_date"]) and l["expiry_date"] < (today or datetime.date.today()).isoformat()
+
+
+@timed
+async def sweep_expired(context: ContextTypes.DEFAULT_TYPE):
+    """Archive listings whose expiry date has passed. Only due listings are touched."""
+    today = datetime.date.today()
+    for listing_id in EXPIRIES.pop_due(today):
+        l = STORE.get(listing_id)
+        if l and not l["archived"] and is_expired(l, today):
+            archive_listing(context.bot, l, "expired")
 
 
 # ========= CANCEL =========
+@timed
 async def cancel_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Cancel the current action."""
     if update.callback_query:
@@ -175,18 +499,22 @@ async def cancel_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 # ========= BASIC COMMANDS =========
+@timed
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     args = context.args
     if args and args[0].startswith("claim_"):
-        msg_id = int(args[0].split("_")[1])
-        l = LISTINGS.get(msg_id)
+        listing_id = int(args[0].split("_")[1])
+        l = await asyncio.to_thread(find_listing, listing_id)
         if not l:
             await update.message.reply_text("❌ This listing is no longer available.")
             return
         if l["remaining"] <= 0:
             await update.message.reply_text("❌ This listing has been fully claimed.")
             return
-        context.user_data["claiming_msg_id"] = msg_id
+        if l["archived"] or is_expired(l):
+            await update.message.reply_text("⌛ This listing has expired.")
+            return
+        context.user_data["claiming_listing_id"] = listing_id
         context.user_data["claim_step"] = "qty"
         await update.message.reply_text(
             f"You’re claiming <b>{l['item']}</b>.\n\n"
@@ -207,53 +535,527 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "This bot helps hospital staff donate and claim excess consumables easily.\n\n"
         "Choose an option below or use these commands:\n"
         "• /newitem – Donate items\n"
+        "• /browse or /search – Find available items\n"
         "• /instructions – Learn how it works"
     )
     await update.message.reply_text(msg, reply_markup=keyboard, parse_mode="HTML")
 
 
+@timed
 async def instructions(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         "ℹ️ <b>How It Works</b>\n\n"
-        "• Staff post excess items using /newitem.\n"
+        "• Staff post excess items using /newitem, or many at once with /bulkpost.\n"
         "• Items appear in the Redistribution Channel.\n"
         "• Others click Claim and coordinate pickup.\n"
-        "• Seller can approve, reject, or suggest new pickup times.\n\n"
+        "• /subscribe gloves M to get a DM when a matching item is posted.\n"
+        "• Seller can approve, reject, or suggest new pickup times.\n"
+        "• /mylistings shows your donations: change the quantity, close or repost them.\n\n"
         "This ensures efficient reuse and minimizes hospital waste ♻️",
         parse_mode="HTML"
     )
 
 
+# ========= BROWSE / SEARCH =========
+RESULTS_PER_PAGE = 8
+
+def render_results(bot_username, query, page):
+    """One page of search results as (text, keyboard) with claim deep links."""
+    ids = SEARCH.search(query)
+    pages = max(1, -(-len(ids) // RESULTS_PER_PAGE))
+    page = min(max(page, 0), pages - 1)
+    heading = f"🔎 Results for <b>{html.escape(query)}</b>" if query else "📋 <b>Available items</b>"
+    if not ids:
+        return f"{heading}\n\nNothing available right now.", None
+
+    rows = []
+    for listing_id in ids[page * RESULTS_PER_PAGE:(page + 1) * RESULTS_PER_PAGE]:
+        l = STORE.get(listing_id)
+        if not l:
+            continue
+        label = f"{l['item']} · {l['size']} · {l['location']} ({l['remaining']} left)"
+        rows.append([InlineKeyboardButton(label, url=f"https://t.me/{bot_username}?start=claim_{listing_id}")])
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("<<", callback_data=f"browse|{page - 1}"))
+    nav.append(InlineKeyboardButton(f"{page + 1}/{pages}", callback_data="noop"))
+    if page < pages - 1:
+        nav.append(InlineKeyboardButton(">>", callback_data=f"browse|{page + 1}"))
+    rows.append(nav)
+    return f"{heading}\n{len(ids)} listing(s) – tap one to claim.", InlineKeyboardMarkup(rows)
+
+
+SEARCHES_KEPT = 20  # result messages per user that can still be paged
+
+
+def remember_search(user_data, message, query):
+    """Keep the query behind a result message, so its buttons page through that query."""
+    searches = user_data.setdefault("searches", {})
+    searches[message.message_id] = query
+    while len(searches) > SEARCHES_KEPT:
+        del searches[next(iter(searches))]
+
+
+@timed
+async def browse(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/browse – list every available item."""
+    text, kb = render_results(context.bot.username, "", 0)
+    msg = await update.message.reply_text(text, reply_markup=kb, parse_mode="HTML")
+    remember_search(context.user_data, msg, "")
+
+
+@timed
+async def search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/search <terms> – items whose name, size or location match every term."""
+    query = " ".join(context.args or []).strip()
+    if not query:
+        await update.message.reply_text("🔎 Usage: /search <terms>, e.g. /search gloves M")
+        return
+    text, kb = render_results(context.bot.username, query, 0)
+    msg = await update.message.reply_text(text, reply_markup=kb, parse_mode="HTML")
+    remember_search(context.user_data, msg, query)
+
+
+async def answer_noop(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Page counters and other inert buttons: stop the button's loading spinner."""
+    await update.callback_query.answer()
+
+
+@timed
+async def browse_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    q = update.callback_query
+    query = context.user_data.get("searches", {}).get(q.message.message_id)
+    if query is None:
+        await q.answer("These results have expired. Send /browse or /search again.", show_alert=True)
+        return
+    await q.answer()
+    page = int(q.data.split("|")[1])
+    text, kb = render_results(context.bot.username, query, page)
+    await q.edit_message_text(text, reply_markup=kb, parse_mode="HTML")
+
+
+# ========= SUBSCRIPTIONS =========
+ALERT_BATCH = 100          # alert DMs handed to the outbox at a time
+ALERT_MAX_LISTINGS = 10    # listings per alert DM
+ALERTS = asyncio.Queue()   # ids of new listings waiting to be matched
+ALERT_TASKS = set()        # the running alert_subscribers task (see METRICS_RUNNERS on bot_data)
+
+
+def notify_subscribers(*listing_ids):
+    """Queue freshly posted listings for subscription alerts; returns immediately."""
+    for listing_id in listing_ids:
+        ALERTS.put_nowait(listing_id)
+
+
+def render_alert(listings, bot_username):
+    lines = []
+    for l in listings[:ALERT_MAX_LISTINGS]:
+        link = f"https://t.me/{bot_username}?start=claim_{l['id']}"
+        lines.append(
+            f"• <b>{html.escape(l['item'])}</b> ({html.escape(l['size'] or 'NA')}) · {l['remaining']} available · "
+            f"📍 {html.escape(l['location'] or '')} · ⏰ {l['expiry']} · <a href=\"{link}\">Claim</a>"
+        )
+    if len(listings) > ALERT_MAX_LISTINGS:
+        lines.append(f"…and {len(listings) - ALERT_MAX_LISTINGS} more. Try /browse.")
+    return ("🔔 <b>New items matching your alerts</b>\n\n" + "\n".join(lines) +
+            "\n\nManage alerts with /subscribe and /unsubscribe.")
+
+
+def match_listings(ids):
+    """``{user_id: [listing, ...]}`` for the still-available listings among ``ids``."""
+    hits = defaultdict(list)
+    for listing_id in ids:
+        l = STORE.get(listing_id)
+        if not l or l["remaining"] <= 0 or l["archived"]:
+            continue
+        for user_id in SUBS.match(l["item"], l["size"], l["location"]):
+            if user_id != l["poster_id"]:
+                hits[user_id].append(l)
+    return hits
+
+
+async def send_alerts(bot, ids, batch_size=ALERT_BATCH):
+    hits = await asyncio.to_thread(match_listings, ids)
+    users = list(hits)
+    sent = 0
+    for start in range(0, len(users), batch_size):
+        batch = users[start:start + batch_size]
+        futures = [
+            OUTBOX.submit(uid, "send_message", priority=PRIORITY_BULK, text=render_alert(hits[uid], bot.username),
+                          parse_mode="HTML", link_preview_options=NO_PREVIEW)
+            for uid in batch
+        ]
+        # Waiting for each batch keeps the outbox queue short for everyone else
+        for uid, result in zip(batch, await asyncio.gather(*futures, return_exceptions=True)):
+            if isinstance(result, Forbidden):
+                # Blocked the bot or deleted their account: stop alerting them
+                await asyncio.to_thread(SUBS.remove, uid)
+            elif isinstance(result, Exception):
+                log.warning("⚠️ Alert to %s failed: %s", uid, result)
+            else:
+                sent += 1
+    if users:
+        log.info("🔔 Sent %d alerts for %d new listings", sent, len(ids))
+
+
+async def alert_subscribers(bot):
+    """Background task: match queued listings against subscriptions and DM the subscribers.
+
+    Listings queued while one round is going out are matched together in the
+    next, so a subscriber gets one DM per round however many items matched.
+    """
+    while True:
+        ids = [await ALERTS.get()]
+        while not ALERTS.empty():
+            ids.append(ALERTS.get_nowait())
+        try:
+            await send_alerts(bot, ids)
+        except Exception:
+            log.exception("⚠️ Error sending subscription alerts")
+
+
+def render_subscriptions(queries):
+    if not queries:
+        return "You have no alerts."
+    return "🔔 <b>Your alerts</b>\n" + "\n".join(f"• {html.escape(q)}" for q in queries)
+
+
+@timed
+async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/subscribe <terms> – DM me when a new listing matches every term."""
+    query = " ".join(context.args or []).strip()
+    uid = update.effective_user.id
+    if not query:
+        queries = await asyncio.to_thread(SUBS.queries, uid)
+        await update.message.reply_text(
+            render_subscriptions(queries) + "\n\nUsage: /subscribe <terms>, e.g. /subscribe gloves M "
+            "or /subscribe Ward 5", parse_mode="HTML"
+        )
+        return
+    if not tokenize(query):
+        await update.message.reply_text("⚠️ Alerts need at least one word or number, e.g. /subscribe gloves M")
+        return
+    if not await asyncio.to_thread(SUBS.add, uid, query):
+        await update.message.reply_text(
+            f"⚠️ You already have {SUBS.max_per_user} alerts. Remove one with /unsubscribe <terms> first."
+        )
+        return
+    await update.message.reply_text(
+        f"🔔 Done! I'll message you when a new item matches <b>{html.escape(query)}</b>.",
+        parse_mode="HTML"
+    )
+
+
+@timed
+async def unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/unsubscribe <terms> | all – stop alerts."""
+    query = " ".join(context.args or []).strip()
+    uid = update.effective_user.id
+    if not query:
+        queries = await asyncio.to_thread(SUBS.queries, uid)
+        await update.message.reply_text(
+            render_subscriptions(queries) + "\n\nUsage: /unsubscribe <terms>, or /unsubscribe all",
+            parse_mode="HTML"
+        )
+        return
+    removed = await asyncio.to_thread(SUBS.remove, uid, None if query.lower() == "all" else query)
+    if removed:
+        await update.message.reply_text(f"🔕 Removed {removed} alert(s).")
+    else:
+        await update.message.reply_text("⚠️ No such alert. Send /unsubscribe to see yours.")
+
+
+# ========= STATS / EXPORT =========
+STATS_TOP = 5
+EXPORT_COLUMNS = ("listing_id", "item", "size", "location", "poster_id", "poster_name",
+                  "user_id", "qty", "time", "claimed_at")
+
+
+def render_stats(month):
+    """The /stats message, built from the store's claim counters only."""
+    total = STORE.impact("total")
+    if not total:
+        return "📊 No items have been claimed yet."
+    _, _, boxes, claims = total[0]
+
+    def section(title, rows):
+        if not rows:
+            return []
+        return ["", f"<b>{title}</b>"] + [
+            f"• {html.escape(label or '—')}: {n} boxes ({c} claims)" for _, label, n, c in rows
+        ]
+
+    this_month = STORE.impact("month", month)
+    lines = [f"📊 <b>Impact</b>\n{boxes} boxes redistributed in {claims} claims"]
+    if this_month:
+        lines.append(f"This month: {this_month[0][2]} boxes in {this_month[0][3]} claims")
+    lines += section(f"Wards in {month}", STORE.impact("location_month", f"{month}|", limit=STATS_TOP))
+    lines += section("Top wards", STORE.impact("location", limit=STATS_TOP))
+    lines += section("Top items", STORE.impact("item", limit=STATS_TOP))
+    lines += section("Top donors", STORE.impact("poster", limit=STATS_TOP))
+    lines += section("By month", sorted(STORE.impact("month"), reverse=True)[:6])
+    return "\n".join(lines)
+
+
+@timed
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/stats – boxes redistributed overall and by ward, item, donor and month."""
+    month = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m")
+    text = await asyncio.to_thread(render_stats, month)
+    await update.message.reply_text(text, parse_mode="HTML")
+
+
+def write_export(f):
+    """Write every claim as a CSV row to ``f``, cold tier first. Returns the number of claims.
+
+    Claims are read a batch at a time, so memory use does not grow with the
+    length of the history.
+    """
+    writer = csv.DictWriter(f, EXPORT_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    written = 0
+    if COLD is not None:
+        seen = set()
+        for l in COLD.scan():
+            # A crash halfway through a move can leave a copy of a listing that is still hot
+            if l["id"] in seen or STORE.get(l["id"]) is not None:
+                continue
+            seen.add(l["id"])
+            for c in l.get("claims", ()):
+                writer.writerow({**l, **c, "listing_id": l["id"]})
+                written += 1
+    for row in STORE.iter_claims():
+        writer.writerow(row)
+        written += 1
+    return written
+
+
+@timed
+async def export(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/export – the full claim history as a CSV document (ADMIN_IDS only)."""
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text("⛔ Only administrators can export the claim history.")
+        return
+    await update.message.reply_text("⏳ Preparing the export…")
+    fd, path = tempfile.mkstemp(prefix="claims-", suffix=".csv")
+    try:
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            written = await asyncio.to_thread(write_export, f)
+        today = datetime.date.today().isoformat()
+        await OUTBOX.submit(update.effective_user.id, "send_document", priority=PRIORITY_BULK,
+                            document=Path(path), filename=f"claims-{today}.csv",
+                            caption=f"📄 {written} claims up to {today}")
+    except Exception:
+        log.exception("⚠️ Export failed")
+        await update.message.reply_text("⚠️ The export failed, please try again later.")
+    finally:
+        os.unlink(path)
+
+
+# ========= MY LISTINGS =========
+MY_PAGE_SIZE = 5
+
+
+def listing_status(l):
+    if l["remaining"] <= 0:
+        return "✅ Fully claimed"
+    if is_expired(l):
+        return "⌛ Expired"
+    if l["archived"]:
+        return "🚫 Closed"
+    return "🟢 Open"
+
+
+def render_my_listings(poster_id, page):
+    """One page of a donor's listings as (text, keyboard), with pending requests and actions."""
+    ids = STORE.poster_listings(poster_id)
+    if not ids:
+        return "📦 You haven't donated anything yet. Use /newitem to post an item.", None
+    pages = max(1, -(-len(ids) // MY_PAGE_SIZE))
+    page = min(max(page, 0), pages - 1)
+    shown = [l for l in (STORE.get(i) for i in ids[page * MY_PAGE_SIZE:(page + 1) * MY_PAGE_SIZE]) if l]
+    pending = TOKENS.pending(l["id"] for l in shown)
+
+    lines = [f"📦 <b>Your listings</b> · page {page + 1}/{pages}"]
+    rows = []
+    for n, l in enumerate(shown, start=page * MY_PAGE_SIZE + 1):
+        line = (f"\n{n}. <b>{html.escape(l['item'])}</b> ({html.escape(l['size'] or 'NA')}) · "
+                f"{l['remaining']} of {l['qty']} left · {listing_status(l)}")
+        requests, boxes = pending.get(l["id"], (0, 0))
+        if requests:
+            line += f"\n⏳ {requests} request(s) waiting for your approval ({boxes} boxes)"
+        lines.append(line)
+        data = f"{l['id']}|{page}"
+        if not l["archived"] and l["remaining"] > 0:
+            rows.append([
+                InlineKeyboardButton(f"{n}. ➖", callback_data=f"my|adjust|{data}|-1"),
+                InlineKeyboardButton("➕", callback_data=f"my|adjust|{data}|1"),
+                InlineKeyboardButton("🚫 Close", callback_data=f"my|close|{data}"),
+                InlineKeyboardButton("🔁 Repost", callback_data=f"my|repost|{data}"),
+            ])
+        elif l["remaining"] > 0 and not is_expired(l):
+            rows.append([InlineKeyboardButton(f"{n}. 🔁 Reopen and repost", callback_data=f"my|repost|{data}")])
+
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("<<", callback_data=f"my|page|0|{page - 1}"))
+    if pages > 1:
+        nav.append(InlineKeyboardButton(f"{page + 1}/{pages}", callback_data="noop"))
+    if page < pages - 1:
+        nav.append(InlineKeyboardButton(">>", callback_data=f"my|page|0|{page + 1}"))
+    if nav:
+        rows.append(nav)
+    return "\n".join(lines), InlineKeyboardMarkup(rows) if rows else None
+
+
+async def adjust_listing(bot, l, delta):
+    delta = int(delta)
+    if l["remaining"] + delta < 1:
+        return "Use 🚫 Close to end the listing."
+    remaining = STORE.adjust_stock(l["id"], delta)
+    if remaining is None:
+        return "⚠️ This listing is closed or its stock just changed."
+    refresh_channel_post(bot, l["id"])
+    return f"📦 {remaining} left."
+
+
+async def close_listing(bot, l):
+    if not STORE.mark_archived(l["id"]):
+        return "It's already closed."
+    SEARCH.remove(l["id"])
+    refresh_channel_post(bot, l["id"])
+    return "🚫 Listing closed."
+
+
+async def repost_listing(bot, l):
+    """Post the listing to the channel again (reopening it if it was closed early)."""
+    if l["remaining"] <= 0 or is_expired(l):
+        return "⚠️ Only listings with stock left that haven't expired can be reposted."
+    if l["archived"]:
+        STORE.update(l["id"], archived=False, archived_at=None)
+        SEARCH.add(l["id"], l["item"], l["size"], l["location"])
+        if l["expiry_date"]:
+            EXPIRIES.push(l["id"], l["expiry_date"])
+        l = STORE.get(l["id"])
+    old = l["channel_msg_id"]
+
+    if l["kind"] == "digest":
+        STORE.update(l["id"], channel_msg_id=None)
+        if old:
+            refresh_digest(bot, old)
+        return "🔁 It will be in the next channel digest."
+
+    photos = (l["photos"] or "").split()
+    kind = l["kind"] if photos and l["kind"] in ("photo", "album") else "text"
+    text, keyboard = render_channel_post({**l, "kind": kind}, bot.username)
+    # Photos go out by their cached file_ids, so nothing is uploaded again
+    if kind == "album":
+        media = [InputMediaPhoto(photos[0], caption=text, parse_mode="HTML")]
+        media += [InputMediaPhoto(file_id) for file_id in photos[1:]]
+        msg = (await OUTBOX.submit(CHANNEL_ID, "send_media_group", priority=PRIORITY_CHANNEL, media=media))[0]
+    elif kind == "photo":
+        msg = await OUTBOX.submit(CHANNEL_ID, "send_photo", priority=PRIORITY_CHANNEL,
+                                  photo=photos[0], caption=text, reply_markup=keyboard, parse_mode="HTML")
+    else:
+        msg = await OUTBOX.submit(CHANNEL_ID, "send_message", priority=PRIORITY_CHANNEL,
+                                  text=text, reply_markup=keyboard, parse_mode="HTML")
+    STORE.update(l["id"], channel_msg_id=msg.message_id, kind=kind)
+    EDITOR.mark_sent(l["id"], (text, keyboard))
+    if old is None:
+        # Never posted before (see requeue_unposted), so not in the search index yet
+        SEARCH.add(l["id"], l["item"], l["size"], l["location"])
+    if old:
+        # The old post stays, but without a Claim button pointing at the same stock. Not via
+        # edit_channel_post: its kind probe would store the old post's kind over the new one's.
+        text = f"🧾 <b>{l['item']}</b>\n🔁 Reposted, see the newer post."
+        kwargs = dict(message_id=old, reply_markup=None, parse_mode="HTML")
+        try:
+            if l["kind"] == "text":
+                await OUTBOX.submit(CHANNEL_ID, "edit_message_text", priority=PRIORITY_CHANNEL, text=text, **kwargs)
+            elif l["kind"] in ("photo", "album"):
+                await OUTBOX.submit(CHANNEL_ID, "edit_message_caption", priority=PRIORITY_CHANNEL,
+                                    caption=text, **kwargs)
+            else:
+                # Posted before the kind was stored
+                try:
+                    await OUTBOX.submit(CHANNEL_ID, "edit_message_caption", priority=PRIORITY_CHANNEL,
+                                        caption=text, **kwargs)
+                except Exception:
+                    await OUTBOX.submit(CHANNEL_ID, "edit_message_text", priority=PRIORITY_CHANNEL,
+                                        text=text, **kwargs)
+        except Exception:
+            log.warning("⚠️ Couldn't mark the old post of listing %s as reposted", l["id"], exc_info=True)
+    return "🔁 Reposted to the channel."
+
+
+MY_ACTIONS = {"adjust": adjust_listing, "close": close_listing, "repost": repost_listing}
+
+
+@timed
+async def mylistings(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/mylistings – the donor's own listings with stock, pending requests and actions."""
+    text, kb = await asyncio.to_thread(render_my_listings, update.effective_user.id, 0)
+    await update.message.reply_text(text, reply_markup=kb, parse_mode="HTML")
+
+
+@timed
+async def my_listings_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Buttons under /mylistings: my|<action>|<listing_id>|<page>[|<arg>]."""
+    q = update.callback_query
+    _, action, listing_id, page, *args = q.data.split("|")
+    note = None
+    if action in MY_ACTIONS:
+        l = STORE.get(int(listing_id))
+        if not l or l["poster_id"] != q.from_user.id:
+            await q.answer("⚠️ This listing no longer exists.", show_alert=True)
+            return
+        note = await MY_ACTIONS[action](context.bot, l, *args)
+    await q.answer(note)
+    text, kb = await asyncio.to_thread(render_my_listings, q.from_user.id, int(page))
+    try:
+        await q.edit_message_text(text, reply_markup=kb, parse_mode="HTML")
+    except BadRequest:
+        pass  # nothing changed on screen
+
+
 # ========= NEW ITEM FLOW =========
+@timed
 async def newitem(update, context):
     await update.message.reply_text("🧾 What item are you donating?")
     return ITEM
 
+@timed
 async def ask_qty(update, context):
     context.user_data["item"] = update.message.text
     await update.message.reply_text("📦 How many boxes or units are available?")
     return QTY
 
+@timed
 async def ask_size(update, context):
     context.user_data["qty"] = update.message.text
     await update.message.reply_text("📏 What is the size? (Type 'NA' if not applicable)")
     return SIZE
 
+@timed
 async def ask_expiry(update, context):
     context.user_data["size"] = update.message.text
     await update.message.reply_text("⏰ Please choose the expiry date:", reply_markup=make_month_calendar())
     return EXPIRY
 
+@timed
 async def calendar_handler(update, context):
     q = update.callback_query
-    await q.answer()
     data = q.data
+    # Each branch answers the tap exactly once; a second answer is a BadRequest
     if data.startswith("nav_"):
+        await q.answer()
         _, y, m = data.split("_")
         await q.edit_message_reply_markup(reply_markup=make_month_calendar(int(y), int(m)))
         return EXPIRY
     elif data.startswith("date_"):
+        await q.answer()
         picked = data.replace("date_", "")
+        context.user_data["expiry_date"] = picked
         context.user_data["expiry"] = datetime.date.fromisoformat(picked).strftime("%d/%m/%y")
         await q.edit_message_text(f"✅ Expiry date: {context.user_data['expiry']}")
         await q.message.reply_text("📍 Where is the pickup location?")
@@ -265,6 +1067,7 @@ async def calendar_handler(update, context):
 
 # ========= Continue Part 2 (Claim, Approve, Suggest, Setup) =========
 # ========= PHOTO + CONFIRMATION FLOW =========
+@timed
 async def ask_photo(update, context):
     """Ask the user to attach a photo or skip."""
     context.user_data["location"] = update.message.text
@@ -272,20 +1075,64 @@ async def ask_photo(update, context):
     return PHOTO
 
 
+ALBUM_SETTLE = 1.0  # seconds without a new part before an album counts as complete
+ALBUM_MAX = 10      # Telegram's limit for one media group
+ALBUMS = {}         # media_group_id -> {"parts": {message_id: file_id}, "timer": settle task}
+
+
+@timed
 async def save_photo(update, context):
-    """Save photo file_id and move to confirmation."""
-    photo = update.message.photo[-1]
-    file = await photo.get_file()
-    context.user_data["photo"] = file.file_id
-    await confirm_post(update, context)
-    return CONFIRM
+    """Save the photo's file_id, or collect a whole album, and move to confirmation.
+
+    The file_id is read off the PhotoSize, so this makes no API calls. Each
+    part of an album arrives as its own update, and one user's updates are
+    handled one after another, so a part can't wait for the next. Instead
+    every part restarts a settle timer and returns straight away; once no
+    part has come in for ALBUM_SETTLE seconds the timer shows the preview.
+    The conversation stays in PHOTO meanwhile, which accepts the preview's
+    buttons as well.
+    """
+    msg = update.message
+    file_id = msg.photo[-1].file_id
+    group = msg.media_group_id
+    if group is None:
+        set_photos(context, [file_id])
+        return await confirm_post(update, context)
+    album = ALBUMS.setdefault(group, {"parts": {}, "timer": None})
+    album["parts"][msg.message_id] = file_id
+    if album["timer"] is not None:
+        album["timer"].cancel()
+    album["timer"] = asyncio.create_task(settle_album(group, update, context))
+    return None
+
+
+async def settle_album(group, update, context):
+    await asyncio.sleep(ALBUM_SETTLE)
+    parts = ALBUMS.pop(group)["parts"]
+    set_photos(context, [parts[k] for k in sorted(parts)][:ALBUM_MAX])
+    try:
+        await confirm_post(update, context)
+    except Exception:
+        log.exception("⚠️ Couldn't show the preview for album %s", group)
 
 
+def set_photos(context, photos):
+    context.user_data.pop("photo", None)
+    context.user_data["photos"] = photos
+
+
+@timed
 async def skip_photo(update, context):
     """Skip photo step."""
-    context.user_data["photo"] = None
-    await confirm_post(update, context)
-    return CONFIRM
+    set_photos(context, [])
+    return await confirm_post(update, context)
+
+
+def listing_photos(d):
+    """File ids of the photos in a new-item conversation (older ones kept a single "photo")."""
+    if "photos" in d:
+        return d["photos"]
+    return [d["photo"]] if d.get("photo") else []
 
 
 async def confirm_post(update, context):
@@ -296,22 +1143,39 @@ async def confirm_post(update, context):
         f"📦 Quantity: {d['qty']}\n"
         f"📏 Size: {d['size']}\n"
         f"⏰ Expiry: {d['expiry']}\n"
-        f"📍 Location: {d['location']}\n\n"
-        "Would you like to post this to the channel?"
+        f"📍 Location: {d['location']}\n"
     )
+    if len(listing_photos(d)) > 1:
+        preview += f"📸 {len(listing_photos(d))} photos\n"
+    preview += "\nWould you like to post this to the channel?"
     buttons = [[
         InlineKeyboardButton("✅ Post", callback_data="confirm_post"),
         InlineKeyboardButton("❌ Cancel", callback_data="cancel_post")
     ]]
+    # Taken by the first tap on Post, so the item can't be posted twice
+    d["post_pending"] = True
     await update.message.reply_text(preview, reply_markup=InlineKeyboardMarkup(buttons), parse_mode="HTML")
     return CONFIRM
 
 
+async def post_failed(q, d):
+    """The item didn't get listed: keep the confirmation open so Post can be tapped again."""
+    log.warning("⚠️ Couldn't post %r for user %s", d.get("item"), q.from_user.id, exc_info=True)
+    d["post_pending"] = True
+    await q.message.reply_text("⚠️ Couldn't post that just now. Tap Post above to try again.")
+    return CONFIRM
+
+
+@timed
 async def post_to_channel(update, context):
     """Publish item to the Telegram channel."""
     q = update.callback_query
-    await q.answer()
     d = context.user_data
+    # Put back by post_failed if the item doesn't get listed
+    if not d.pop("post_pending", False):
+        await q.answer("Already posted.")
+        return ConversationHandler.END
+    await q.answer()
 
     text = (
         f"🧾 <b>{d['item']}</b>\n"
@@ -321,30 +1185,62 @@ async def post_to_channel(update, context):
         f"📍 {d['location']}"
     )
 
-    photo = d.get("photo")
-    if photo:
-        msg = await context.bot.send_photo(CHANNEL_ID, photo=photo, caption=text, parse_mode="HTML")
-    else:
-        msg = await context.bot.send_message(CHANNEL_ID, text, parse_mode="HTML")
+    if DIGEST_MINUTES:
+        try:
+            listing_id = STORE.allocate_id()
+            STORE.add(listing_id, {
+                "poster_id": q.from_user.id,
+                "poster_name": q.from_user.username,
+                "item": d["item"],
+                "qty": int(d["qty"]),
+                "remaining": int(d["qty"]),
+                "size": d["size"],
+                "expiry": d["expiry"],
+                "location": d["location"],
+                "channel_msg_id": None,
+                "kind": "digest",
+                "expiry_date": d.get("expiry_date"),
+                # Not shown in the digest, but kept for reposts
+                "photos": " ".join(listing_photos(d)) or None,
+            })
+        except Exception:
+            return await post_failed(q, d)
+        if d.get("expiry_date"):
+            EXPIRIES.push(listing_id, d["expiry_date"])
+        SEARCH.add(listing_id, d["item"], d["size"], d["location"])
+        notify_subscribers(listing_id)
+        await q.edit_message_text(
+            "✅ Listed! It is claimable now and will appear in the next channel digest."
+        )
+        return ConversationHandler.END
 
+    # Allocate the listing id first so the Claim button goes out with the post
+    listing_id = STORE.allocate_id()
     keyboard = InlineKeyboardMarkup([
-        [InlineKeyboardButton("🤝 Claim", url=f"https://t.me/{context.bot.username}?start=claim_{msg.message_id}")]
+        [InlineKeyboardButton("🤝 Claim", url=f"https://t.me/{context.bot.username}?start=claim_{listing_id}")]
     ])
 
-    # Try editing caption first (if photo)
+    photos = listing_photos(d)
     try:
-        await context.bot.edit_message_caption(
-            chat_id=CHANNEL_ID, message_id=msg.message_id,
-            caption=text, reply_markup=keyboard, parse_mode="HTML"
-        )
+        if len(photos) > 1:
+            kind = "album"
+            # One call for the whole album; the caption on the first photo is what gets edited later
+            media = [InputMediaPhoto(photos[0], caption=text + album_claim_link(context.bot.username, listing_id),
+                                     parse_mode="HTML")]
+            media += [InputMediaPhoto(file_id) for file_id in photos[1:]]
+            msg = (await OUTBOX.submit(CHANNEL_ID, "send_media_group", priority=PRIORITY_CHANNEL, media=media))[0]
+        elif photos:
+            kind = "photo"
+            msg = await OUTBOX.submit(CHANNEL_ID, "send_photo", priority=PRIORITY_CHANNEL,
+                                      photo=photos[0], caption=text, reply_markup=keyboard, parse_mode="HTML")
+        else:
+            kind = "text"
+            msg = await OUTBOX.submit(CHANNEL_ID, "send_message", priority=PRIORITY_CHANNEL,
+                                      text=text, reply_markup=keyboard, parse_mode="HTML")
     except Exception:
-        await context.bot.edit_message_text(
-            chat_id=CHANNEL_ID, message_id=msg.message_id,
-            text=text, reply_markup=keyboard, parse_mode="HTML"
-        )
+        return await post_failed(q, d)
 
-    # Store listing in memory
-    LISTINGS[msg.message_id] = {
+    STORE.add(listing_id, {
         "poster_id": q.from_user.id,
         "poster_name": q.from_user.username,
         "item": d["item"],
@@ -353,45 +1249,209 @@ async def post_to_channel(update, context):
         "size": d["size"],
         "expiry": d["expiry"],
         "location": d["location"],
-        "claims": []
-    }
-    save_listings()
+        "channel_msg_id": msg.message_id,
+        "kind": kind,
+        "expiry_date": d.get("expiry_date"),
+        "photos": " ".join(photos) or None,
+    })
+    if d.get("expiry_date"):
+        EXPIRIES.push(listing_id, d["expiry_date"])
+    SEARCH.add(listing_id, d["item"], d["size"], d["location"])
+    notify_subscribers(listing_id)
     await q.edit_message_text("✅ Posted to channel!")
     return ConversationHandler.END
 
+# ========= BULK POST =========
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "200"))
+BULK_MAX_BYTES = 1024 * 1024
+BULK_PREVIEW_ROWS = 10
+
+@timed
+async def bulkpost(update, context):
+    await update.message.reply_text(
+        "📑 Send a CSV or Excel (.xlsx) file with one item per row and the columns "
+        "<b>item, qty, size, expiry, location</b>.\n"
+        "Expiry as DD/MM/YY or YYYY-MM-DD. Type /cancel to stop.",
+        parse_mode="HTML"
+    )
+    return BULK_FILE
+
+
+@timed
+async def bulk_file(update, context):
+    """Parse the uploaded sheet and show one preview of everything it would post."""
+    doc = update.message.document
+    if doc.file_size and doc.file_size > BULK_MAX_BYTES:
+        await update.message.reply_text("⚠️ That file is too large (1 MB at most).")
+        return BULK_FILE
+    buf = io.BytesIO()
+    await (await doc.get_file()).download_to_memory(buf)
+    buf.seek(0)
+    try:
+        items, errors = await asyncio.to_thread(
+            parse_listings, buf, doc.file_name or "", datetime.date.today(), BULK_MAX_ROWS
+        )
+    except BulkImportError as e:
+        await update.message.reply_text(f"⚠️ {e}")
+        return BULK_FILE
+
+    skipped = "".join(f"\n• {html.escape(e)}" for e in errors[:5])
+    if errors:
+        skipped = f"\n\n⚠️ <b>{len(errors)} row(s) skipped:</b>{skipped}"
+        if len(errors) > 5:
+            skipped += f"\n… and {len(errors) - 5} more"
+    if not items:
+        await update.message.reply_text(f"⚠️ No valid rows found.{skipped}", parse_mode="HTML")
+        return BULK_FILE
+
+    context.user_data["bulk_items"] = items
+    lines = "\n".join(
+        f"• <b>{html.escape(d['item'])}</b> ×{d['qty']} ({html.escape(d['size'])}), "
+        f"exp {d['expiry']}, {html.escape(d['location'])}"
+        for d in items[:BULK_PREVIEW_ROWS]
+    )
+    if len(items) > BULK_PREVIEW_ROWS:
+        lines += f"\n… and {len(items) - BULK_PREVIEW_ROWS} more"
+    buttons = [[
+        InlineKeyboardButton(f"✅ Post all {len(items)}", callback_data="bulk_confirm"),
+        InlineKeyboardButton("❌ Cancel", callback_data="cancel_post")
+    ]]
+    await update.message.reply_text(
+        f"📋 <b>{len(items)} item(s) ready to post</b>\n\n{lines}{skipped}",
+        reply_markup=InlineKeyboardMarkup(buttons), parse_mode="HTML"
+    )
+    return BULK_CONFIRM
+
+
+@timed
+async def bulk_confirm(update, context):
+    """Store every listing in one write, then hand the channel posts to a background batch."""
+    q = update.callback_query
+    await q.answer()
+    items = context.user_data.pop("bulk_items", None)
+    if not items:
+        await q.edit_message_text("⚠️ Nothing to post. Start again with /bulkpost.")
+        return ConversationHandler.END
+
+    user = q.from_user
+    kind = "digest" if DIGEST_MINUTES else "text"
+    listings = [
+        {**d, "poster_id": user.id, "poster_name": user.username, "remaining": d["qty"], "kind": kind}
+        for d in items
+    ]
+    ids = STORE.add_many(listings)
+    await WRITER.flush()
+    for listing_id, d in zip(ids, listings):
+        EXPIRIES.push(listing_id, d["expiry_date"])
+    if DIGEST_MINUTES:
+        for listing_id, d in zip(ids, listings):
+            SEARCH.add(listing_id, d["item"], d["size"], d["location"])
+        notify_subscribers(*ids)
+        await q.edit_message_text(f"✅ Listed {len(ids)} items. They will appear in the next channel digest.")
+        return ConversationHandler.END
+    await q.edit_message_text(f"📤 Posting {len(ids)} items to the channel…")
+    context.application.create_task(post_batch(context.bot, q.message.chat_id, q.message.message_id, ids))
+    return ConversationHandler.END
+
+
+async def post_batch(bot, chat_id, message_id, ids, progress_every=5.0):
+    """Post freshly stored listings through the outbox and keep the uploader's message updated.
+
+    All posts are queued at once at bulk priority; the outbox's channel
+    bucket paces them, and anyone else's DMs and posts go out first.
+    Until its post goes out a listing has no channel_msg_id, which keeps it
+    out of /browse; listings whose post fails are archived. ``chat_id`` is
+    None when there is no uploader's message to update (see requeue_unposted).
+    """
+    futures = []
+    for listing_id in ids:
+        text, keyboard = render_channel_post(STORE.get(listing_id), bot.username)
+        futures.append(OUTBOX.submit(CHANNEL_ID, "send_message", priority=PRIORITY_BULK,
+                                     text=text, reply_markup=keyboard, parse_mode="HTML"))
+    posted = failed = 0
+    last_progress = time.monotonic()
+    for listing_id, future in zip(ids, futures):
+        try:
+            msg = await future
+        except Exception:
+            log.warning("⚠️ Bulk post of listing %s failed", listing_id, exc_info=True)
+            STORE.mark_archived(listing_id)
+            failed += 1
+            continue
+        STORE.update(listing_id, channel_msg_id=msg.message_id)
+        l = STORE.get(listing_id)
+        SEARCH.add(listing_id, l["item"], l["size"], l["location"])
+        notify_subscribers(listing_id)
+        posted += 1
+        if chat_id is not None and time.monotonic() - last_progress >= progress_every:
+            last_progress = time.monotonic()
+            OUTBOX.send(chat_id, "edit_message_text", message_id=message_id,
+                        text=f"📤 Posted {posted} of {len(ids)} items…")
+    summary = f"✅ Posted {posted} of {len(ids)} items to the channel."
+    if failed:
+        summary += f"\n⚠️ {failed} could not be posted and were withdrawn."
+    if chat_id is None:
+        log.info("📤 %s", summary)
+        return
+    OUTBOX.send(chat_id, "edit_message_text", message_id=message_id, text=summary)
+
+
+def requeue_unposted(app):
+    """Post listings a bulk upload stored but didn't get to post before the last restart.
+
+    Not in cluster mode: another process may be posting them right now. Donors
+    can still post those with Repost in /mylistings.
+    """
+    ids = STORE.unposted()
+    if not ids:
+        return
+    if CLUSTER_SHARDS:
+        log.warning("📤 %d stored listings were never posted; their donors can repost them", len(ids))
+        return
+    log.info("📤 Posting %d listings left over from an interrupted bulk upload", len(ids))
+    app.create_task(post_batch(app.bot, None, None, ids))
+
+
 # ========= CLAIM FLOW =========
+@timed
 async def private_message(update, context):
     """Handle private chat between buyer and bot."""
     if "claim_step" not in context.user_data:
         return
-    msg_id = context.user_data.get("claiming_msg_id")
-    if msg_id is None or msg_id not in LISTINGS:
+    listing_id = context.user_data.get("claiming_listing_id")
+    l = STORE.get(listing_id) if listing_id is not None else None
+    if l is None:
         await update.message.reply_text("⚠️ I can’t find that listing. Please tap Claim again.")
         context.user_data.clear()
         return
 
-    l = LISTINGS[msg_id]
     step = context.user_data["claim_step"]
     user = update.effective_user
 
     if step == "qty":
-        context.user_data["claim_qty"] = int(update.message.text)
+        text = update.message.text.strip()
+        if not text.isdigit() or not 0 < int(text) <= l["remaining"]:
+            await update.message.reply_text(f"⚠️ Please enter a number between 1 and {l['remaining']}.")
+            return
+        context.user_data["claim_qty"] = int(text)
         context.user_data["claim_step"] = "time"
         await update.message.reply_text("🕓 When can you collect? (e.g. 10 Oct 2025, 3–5 pm)")
     elif step == "time":
         pickup_time = update.message.text
         qty = context.user_data["claim_qty"]
         seller_id = l["poster_id"]
+        token = TOKENS.issue({"type": CLAIM, "listing_id": listing_id, "buyer_id": user.id, "qty": qty,
+                              "time": pickup_time})
         kb = InlineKeyboardMarkup([
             [
-                InlineKeyboardButton("✅ Approve", callback_data=f"approve|{msg_id}|{user.id}|{qty}|{pickup_time}"),
-                InlineKeyboardButton("🕓 Suggest New Date/Time", callback_data=f"suggest|{msg_id}|{user.id}|{qty}"),
-                InlineKeyboardButton("❌ Reject", callback_data=f"reject|{msg_id}|{user.id}|{qty}|{pickup_time}")
+                InlineKeyboardButton("✅ Approve", callback_data=f"approve|{token}"),
+                InlineKeyboardButton("🕓 Suggest New Date/Time", callback_data=f"suggest|{token}"),
+                InlineKeyboardButton("❌ Reject", callback_data=f"reject|{token}")
             ]
         ])
-        await context.bot.send_message(
-            seller_id,
-            f"📨 <b>Claim Request</b>\n\n"
+        OUTBOX.send(
+            seller_id, "send_message",
+            text=f"📨 <b>Claim Request</b>\n\n"
             f"👤 @{user.username or user.first_name} wants to claim:\n"
             f"• <b>{qty}</b> of <b>{l['item']}</b>\n"
             f"• Collection: {pickup_time}",
@@ -402,12 +1462,35 @@ async def private_message(update, context):
 
 
 # ========= APPROVE / REJECT HANDLER =========
+async def redeem(q, consume=True):
+    """The record behind the token in ``q.data``, or None after telling the user why not.
+
+    Buttons from before tokens existed carry no valid token and are
+    reported as no longer valid.
+    """
+    token = q.data.split("|")[1]
+    record = TOKENS.consume(token) if consume else TOKENS.peek(token)
+    if isinstance(record, dict):
+        await q.answer()
+        return record
+    if record == USED:
+        # A double tap: the first one has already updated this message
+        await q.answer("Already handled.")
+    else:
+        await q.answer()
+        await q.edit_message_text(TOKEN_ERRORS[record])
+    return None
+
+
+@timed
 async def handle_claim_decision(update, context):
     q = update.callback_query
-    await q.answer()
-    action, msg_id, user_id, qty, pickup_time = q.data.split("|")
-    msg_id, user_id, qty = int(msg_id), int(user_id), int(qty)
-    l = LISTINGS.get(msg_id)
+    claim = await redeem(q)
+    if claim is None:
+        return
+    action = q.data.split("|")[0]
+    listing_id, user_id, qty, pickup_time = claim["listing_id"], claim["buyer_id"], claim["qty"], claim["time"]
+    l = STORE.get(listing_id)
     if not l:
         await q.edit_message_text("⚠️ Listing no longer exists.")
         return
@@ -415,16 +1498,13 @@ async def handle_claim_decision(update, context):
     buyer = await context.bot.get_chat(user_id)
 
     if action == "approve":
-        if l["remaining"] < qty:
+        if STORE.reserve(listing_id, user_id, qty, pickup_time) is None:
             await q.edit_message_text("⚠️ Not enough remaining stock to approve.")
             return
-        l["remaining"] -= qty
-        l["claims"].append({"user_id": user_id, "qty": qty, "time": pickup_time})
-        save_listings()
-        await update_channel_post(context, msg_id)
-        await context.bot.send_message(
-            user_id,
-            f"✅ Your claim for <b>{l['item']}</b> has been approved!\n\n"
+        await update_channel_post(context, listing_id)
+        OUTBOX.send(
+            user_id, "send_message",
+            text=f"✅ Your claim for <b>{l['item']}</b> has been approved!\n\n"
             f"📦 Quantity: <b>{qty}</b>\n"
             f"⏰ Pickup: <b>{pickup_time}</b>\n"
             f"📍 Location: <b>{l['location']}</b>",
@@ -433,24 +1513,29 @@ async def handle_claim_decision(update, context):
         await q.edit_message_text(f"✅ Approved claim for @{buyer.username or buyer.first_name} ({qty}× {l['item']})")
 
     elif action == "reject":
-        await context.bot.send_message(
-            user_id,
-            f"❌ Your claim for <b>{l['item']}</b> has been rejected.",
+        OUTBOX.send(
+            user_id, "send_message",
+            text=f"❌ Your claim for <b>{l['item']}</b> has been rejected.",
             parse_mode="HTML"
         )
         await q.edit_message_text(f"❌ Rejected claim for @{buyer.username or buyer.first_name}.")
 
 
 # ========= SUGGEST NEW DATE/TIME FLOW =========
+@timed
 async def suggest_time(update, context):
     q = update.callback_query
-    await q.answer()
-    _, msg_id, uid, qty = q.data.split("|")
-    context.user_data["suggest_info"] = (int(msg_id), int(uid), int(qty))
+    # Only peek: the claim is used up once the proposal is actually sent
+    claim = await redeem(q, consume=False)
+    if claim is None:
+        return ConversationHandler.END
+    context.user_data["suggest_token"] = q.data.split("|")[1]
+    context.user_data["suggest_info"] = (claim["listing_id"], claim["buyer_id"], claim["qty"])
     await q.message.reply_text("📅 Please choose a new pickup date:", reply_markup=make_month_calendar())
     return SUGGEST
 
 
+@timed
 async def handle_suggest_calendar(update, context):
     q = update.callback_query
     await q.answer()
@@ -467,16 +1552,22 @@ async def handle_suggest_calendar(update, context):
         return SUGGEST
 
 
+@timed
 async def handle_suggest_time_text(update, context):
     user_time = update.message.text.strip()
-    msg_id, uid, qty = context.user_data["suggest_info"]
+    listing_id, uid, qty = context.user_data["suggest_info"]
     new_date = context.user_data["new_date"]
-    l = LISTINGS[msg_id]
+    l = STORE.get(listing_id)
     proposed_time = f"{new_date}, {user_time}"
+    if not isinstance(TOKENS.consume(context.user_data.get("suggest_token", "")), dict):
+        await update.message.reply_text("⚠️ This claim was already handled or has expired.")
+        context.user_data.clear()
+        return ConversationHandler.END
 
+    token = TOKENS.issue({"type": PROPOSAL, "listing_id": listing_id, "buyer_id": uid, "qty": qty, "time": proposed_time})
     kb = InlineKeyboardMarkup([
-        [InlineKeyboardButton("✅ Accept", callback_data=f"accept_newtime|{msg_id}|{qty}|{proposed_time}"),
-         InlineKeyboardButton("❌ Decline", callback_data=f"decline_newtime|{msg_id}")]
+        [InlineKeyboardButton("✅ Accept", callback_data=f"accept_newtime|{token}"),
+         InlineKeyboardButton("❌ Decline", callback_data=f"decline_newtime|{token}")]
     ])
     msg = (
         "📌 <b>IMPORTANT – SAVE THIS MESSAGE</b>\n\n"
@@ -486,41 +1577,47 @@ async def handle_suggest_time_text(update, context):
         f"📍 Location: <b>{l['location']}</b>\n\n"
         "Do you accept this proposal?"
     )
-    await context.bot.send_message(uid, msg, reply_markup=kb, parse_mode="HTML")
+    OUTBOX.send(uid, "send_message", text=msg, reply_markup=kb, parse_mode="HTML")
     await update.message.reply_text("✅ Sent your proposed new date/time to the buyer.")
     context.user_data.clear()
     return ConversationHandler.END
 
 
+@timed
 async def handle_newtime_reply(update, context):
     q = update.callback_query
-    await q.answer()
-    parts = q.data.split("|")
-    action, msg_id = parts[0], int(parts[1])
-    l = LISTINGS.get(msg_id)
+    proposal = await redeem(q)
+    if proposal is None:
+        return
+    action = q.data.split("|")[0]
+    listing_id = proposal["listing_id"]
+    l = STORE.get(listing_id)
     buyer = q.from_user
     if not l:
         await q.edit_message_text("⚠️ Listing no longer available.")
         return
 
     if action == "accept_newtime":
-        qty, proposed_time = int(parts[2]), parts[3]
-        l["remaining"] -= qty
-        l["claims"].append({"user_id": buyer.id, "qty": qty, "time": proposed_time})
-        save_listings()
-        await update_channel_post(context, msg_id)
-        await context.bot.send_message(
-            l["poster_id"],
-            f"✅ Buyer @{buyer.username or buyer.first_name} accepted your new pickup timing:\n{proposed_time} ({qty} boxes)."
+        qty, proposed_time = proposal["qty"], proposal["time"]
+        if STORE.reserve(listing_id, buyer.id, qty, proposed_time) is None:
+            await q.edit_message_text("⚠️ Sorry, there is no longer enough stock for this pickup.")
+            return
+        await update_channel_post(context, listing_id)
+        OUTBOX.send(
+            l["poster_id"], "send_message",
+            text=f"✅ Buyer @{buyer.username or buyer.first_name} accepted your new pickup timing:\n{proposed_time} ({qty} boxes)."
         )
         await q.edit_message_text(f"✅ Pickup confirmed for {qty} of {l['item']} at {proposed_time}.")
     elif action == "decline_newtime":
-        await context.bot.send_message(l["poster_id"], f"❌ Buyer @{buyer.username or buyer.first_name} declined your new timing.")
+        OUTBOX.send(l["poster_id"], "send_message",
+                    text=f"❌ Buyer @{buyer.username or buyer.first_name} declined your new timing.")
         await q.edit_message_text("❌ You declined the new timing. Claim cancelled.")
 
 
 # ========= HANDLER CONFIG =========
 conv_handler = ConversationHandler(
+    name="newitem",
+    persistent=True,
     entry_points=[CommandHandler("newitem", newitem)],
     states={
         ITEM: [MessageHandler(filters.TEXT & ~filters.COMMAND, ask_qty)],
@@ -530,7 +1627,10 @@ conv_handler = ConversationHandler(
         LOCATION: [MessageHandler(filters.TEXT & ~filters.COMMAND, ask_photo)],
         PHOTO: [
             MessageHandler(filters.PHOTO, save_photo),
-            MessageHandler(filters.Regex("^(Skip|skip)$"), skip_photo)
+            MessageHandler(filters.Regex("^(Skip|skip)$"), skip_photo),
+            # An album's preview is sent from a timer, so the conversation is still in PHOTO
+            CallbackQueryHandler(post_to_channel, pattern="confirm_post"),
+            CallbackQueryHandler(cancel_post, pattern="cancel_post")
         ],
         CONFIRM: [
             CallbackQueryHandler(post_to_channel, pattern="confirm_post"),
@@ -541,6 +1641,8 @@ conv_handler = ConversationHandler(
 )
 
 suggest_conv = ConversationHandler(
+    name="suggest",
+    persistent=True,
     entry_points=[CallbackQueryHandler(suggest_time, pattern="^suggest")],
     states={
         SUGGEST: [
@@ -552,27 +1654,128 @@ suggest_conv = ConversationHandler(
 )
 
 
+bulk_conv = ConversationHandler(
+    name="bulkpost",
+    persistent=True,
+    entry_points=[CommandHandler("bulkpost", bulkpost, filters=filters.ChatType.PRIVATE)],
+    states={
+        BULK_FILE: [MessageHandler(filters.Document.ALL, bulk_file)],
+        BULK_CONFIRM: [
+            CallbackQueryHandler(bulk_confirm, pattern="^bulk_confirm$"),
+            CallbackQueryHandler(cancel_post, pattern="^cancel_post$")
+        ],
+    },
+    fallbacks=[CommandHandler("cancel", cancel_post)],
+)
+
+
 # ========= APP SETUP =========
-load_listings()
-
-app = Application.builder().token(BOT_TOKEN).build()
-app.add_handler(CommandHandler("start", start))
-app.add_handler(CommandHandler("instructions", instructions))
-app.add_handler(conv_handler)
-app.add_handler(suggest_conv)
-app.add_handler(MessageHandler(filters.ChatType.PRIVATE & filters.TEXT, private_message))
-app.add_handler(CallbackQueryHandler(handle_newtime_reply, pattern="^(accept_newtime|decline_newtime)"))
-app.add_handler(CallbackQueryHandler(handle_claim_decision, pattern="^(approve|reject)"))
-app.add_handler(CommandHandler("cancel", cancel_post))
+# Live objects the app owns while running; bot_data is deep-copied and pickled, so they can't go there
+METRICS_RUNNERS = []
+
 
 async def set_commands(app):
     await app.bot.set_my_commands([
         BotCommand("start", "Show main menu"),
         BotCommand("newitem", "Donate an excess item"),
+        BotCommand("bulkpost", "Donate many items from a spreadsheet"),
+        BotCommand("mylistings", "See and manage your donations"),
+        BotCommand("browse", "List available items"),
+        BotCommand("search", "Search available items"),
+        BotCommand("subscribe", "Get a DM when matching items are posted"),
+        BotCommand("unsubscribe", "Stop item alerts"),
+        BotCommand("stats", "Items redistributed so far"),
         BotCommand("instructions", "How the bot works"),
         BotCommand("cancel", "Cancel current action"),
     ])
-app.post_init = set_commands
+    OUTBOX.start(app.bot)
+    WRITER.start()
+    requeue_unposted(app)
+    ALERT_TASKS.add(asyncio.create_task(alert_subscribers(app.bot)))
+    DIGEST_NOTES.update(app.bot_data.get("digest_notes", {}))
+    if METRICS_PORT:
+        METRICS_RUNNERS.append(await start_metrics_server(METRICS_PORT))
+        log.info("📈 Metrics on http://127.0.0.1:%d/metrics", METRICS_PORT)
+
+async def shutdown(app):
+    """Send pending channel edits and flush listings still waiting for the writer."""
+    await EDITOR.flush_all()
+    for task in ALERT_TASKS:
+        task.cancel()
+    await OUTBOX.stop()
+    await WRITER.stop()
+    while METRICS_RUNNERS:
+        await METRICS_RUNNERS.pop().cleanup()
+    stats = WRITER.stats()
+    log.info("💾 Listings flushed (%d flushes, max %.1f ms).", stats["flushes"], stats["max_flush_seconds"] * 1000)
+
+
+def build_app(request=None):
+    """Build the Application. ``request`` replaces the HTTP layer (e.g. for offline benchmarks)."""
+    # Stock is reserved with a compare-and-swap in the store, so updates from
+    # different users can safely be processed concurrently; each user's own
+    # updates run in order so their conversations never see a stale state.
+    builder = (
+        Application.builder().token(BOT_TOKEN).concurrent_updates(PerUserUpdateProcessor(256))
+        .request(request or InstrumentedRequest(connection_pool_size=256))
+        .get_updates_request(request or InstrumentedRequest(connection_pool_size=1))
+        # In-flight donations and claims survive restarts
+        .persistence(SQLitePersistence(os.getenv("STATE_DB", "state.db")))
+    )
+    if BOT_API_URL:
+        builder = builder.base_url(f"{BOT_API_URL}/bot").base_file_url(f"{BOT_API_URL}/file/bot")
+    if WEBHOOK_URL or CLUSTER_SHARDS:
+        # Updates arrive through our own server or the cluster inbox, not the Updater
+        builder = builder.updater(None)
+    app = builder.build()
+    app.add_handler(CommandHandler("start", start))
+    app.add_handler(CommandHandler("instructions", instructions))
+    app.add_handler(CommandHandler("browse", browse, filters=filters.ChatType.PRIVATE))
+    app.add_handler(CommandHandler("search", search, filters=filters.ChatType.PRIVATE))
+    app.add_handler(CommandHandler("subscribe", subscribe, filters=filters.ChatType.PRIVATE))
+    app.add_handler(CommandHandler("unsubscribe", unsubscribe, filters=filters.ChatType.PRIVATE))
+    app.add_handler(CommandHandler("stats", stats, filters=filters.ChatType.PRIVATE))
+    app.add_handler(CommandHandler("export", export, filters=filters.ChatType.PRIVATE))
+    app.add_handler(CommandHandler("mylistings", mylistings, filters=filters.ChatType.PRIVATE))
+    app.add_handler(CallbackQueryHandler(my_listings_action, pattern=r"^my\|"))
+    app.add_handler(CallbackQueryHandler(browse_page, pattern=r"^browse\|"))
+    app.add_handler(CallbackQueryHandler(digest_page, pattern=r"^digest\|"))
+    app.add_handler(conv_handler)
+    app.add_handler(suggest_conv)
+    app.add_handler(bulk_conv)
+    app.add_handler(MessageHandler(filters.ChatType.PRIVATE & filters.TEXT, private_message))
+    app.add_handler(CallbackQueryHandler(handle_newtime_reply, pattern="^(accept_newtime|decline_newtime)"))
+    app.add_handler(CallbackQueryHandler(handle_claim_decision, pattern="^(approve|reject)"))
+    # After the conversations, so a calendar in progress still gets its own noop taps
+    app.add_handler(CallbackQueryHandler(answer_noop, pattern="^noop$"))
+    app.add_handler(CommandHandler("cancel", cancel_post))
+    app.job_queue.run_repeating(sweep_expired, interval=int(os.getenv("EXPIRY_SWEEP_SECONDS", "900")), first=10)
+    if DIGEST_MINUTES:
+        app.job_queue.run_repeating(publish_digest, interval=DIGEST_MINUTES * 60, first=DIGEST_MINUTES * 60)
+    app.job_queue.run_repeating(purge_tokens, interval=3600, first=60)
+    if COLD is not None:
+        app.job_queue.run_repeating(move_to_cold, interval=int(os.getenv("COLD_MOVE_SECONDS", "3600")), first=60)
+    if CLUSTER_SHARDS:
+        app.job_queue.run_repeating(resync_indexes, interval=int(os.getenv("INDEX_RESYNC_SECONDS", "30")), first=30)
+    app.post_init = set_commands
+    app.post_shutdown = shutdown
+    return app
+
+
+def main():
+    configure_logging(LOG_JSON)
+    load_listings()
+    load_expiries()
+    load_search_index()
+    app = build_app()
+    log.info("🤖 Bot running with persistence + live counter + auto-archive notifications ...")
+    if CLUSTER_SHARDS:
+        asyncio.run(run_cluster(app, CLUSTER_DB, CLUSTER_SHARD, CLUSTER_SHARDS))
+    elif WEBHOOK_URL:
+        asyncio.run(run_webhook(app, WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_SECRET))
+    else:
+        app.run_polling()
+
 
-print("🤖 Bot running with persistence + live counter + auto-archive notifications ...")
-app.run_polling()
+if __name__ == "__main__":
+    main()
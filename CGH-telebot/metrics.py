@@ -0,0 +1,205 @@
+# ==============================
+# 📈 Metrics and logging
+# - Counters, gauges and histograms in Prometheus text format
+# - Handler and Bot API call instrumentation
+# - Optional structured JSON logs
+# ==============================
+
+import bisect, functools, json, logging, time
+
+from aiohttp import web
+from telegram.request import HTTPXRequest
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    """A labelled metric. Unlabelled ones may instead be read from ``fn`` at scrape time."""
+
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=(), fn=None):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.fn = fn
+        self._values = {}
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self):
+        values = dict(self._values)
+        if self.fn is not None:
+            values[()] = self.fn()
+        return self.header() + [f"{self.name}{_labels(self.label_names, k)} {v}" for k, v in values.items()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, value, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * len(self.buckets), 0, 0.0]
+        counts = series[0]
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(counts):
+            counts[i] += 1
+        series[1] += 1
+        series[2] += value
+
+    def render(self):
+        lines = self.header()
+        names = self.label_names + ("le",)
+        for labels, (counts, total, sum_) in self._series.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_labels(names, labels + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(names, labels + ('+Inf',))} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {sum_}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self):
+        lines = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+HANDLER_SECONDS = REGISTRY.histogram("bot_handler_seconds", "Update handler latency", ("handler",))
+HANDLER_ERRORS = REGISTRY.counter("bot_handler_errors_total", "Update handlers that raised", ("handler",))
+API_SECONDS = REGISTRY.histogram("bot_api_request_seconds", "Bot API call latency", ("method",))
+API_CALLS = REGISTRY.counter("bot_api_requests_total", "Bot API calls", ("method",))
+API_ERRORS = REGISTRY.counter("bot_api_errors_total", "Bot API calls that failed", ("method",))
+FLUSH_SECONDS = REGISTRY.histogram("store_flush_seconds", "Listing store flush duration")
+OUTBOX_WAIT_SECONDS = REGISTRY.histogram("outbox_wait_seconds", "Time outbound messages spent queued")
+
+
+# ========= INSTRUMENTATION =========
+def timed(handler):
+    """Record latency and errors of an update handler under its function name."""
+    name = handler.__name__
+
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await handler(*args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, name)
+
+    return wrapper
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest that records per-method call counts, latency and errors."""
+
+    async def do_request(self, url, method, request_data=None, *args, **kwargs):
+        api_method = url.rsplit("/", 1)[-1]
+        API_CALLS.inc(api_method)
+        started = time.perf_counter()
+        try:
+            status, payload = await super().do_request(url, method, request_data, *args, **kwargs)
+        except Exception:
+            API_ERRORS.inc(api_method)
+            raise
+        finally:
+            API_SECONDS.observe(time.perf_counter() - started, api_method)
+        if status >= 400:
+            API_ERRORS.inc(api_method)
+        return status, payload
+
+
+# ========= HTTP ENDPOINT =========
+async def start_metrics_server(port, host="127.0.0.1"):
+    """Serve ``/metrics`` on a local port. Returns the runner to clean up later."""
+
+    async def metrics(request):
+        return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8")
+
+    web_app = web.Application()
+    web_app.router.add_get("/metrics", metrics)
+    runner = web.AppRunner(web_app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+# ========= LOGGING =========
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def configure_logging(json_logs=False, level=logging.INFO):
+    handler = logging.StreamHandler()
+    if json_logs:
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logging.basicConfig(level=level, handlers=[handler], force=True)
+    # httpx logs every request at INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
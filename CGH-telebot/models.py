@@ -0,0 +1,202 @@
+# ==============================
+# 🧱 Compact listing model
+# - Listing / Claim as __slots__ dataclasses
+# - Heavily repeated strings (sizes, wards, dates) interned
+# - Binary snapshot codec with a shared string table
+# ==============================
+
+import datetime, functools, struct, sys
+from dataclasses import dataclass, field
+
+LISTING_FIELDS = ("poster_id", "poster_name", "item", "qty", "remaining", "size", "expiry", "location", "archived",
+                  "channel_msg_id", "kind", "expiry_date", "archived_at", "photos")
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_display_expiry(expiry):
+    """ISO date for a "%d/%m/%y" display expiry, or None if it isn't one."""
+    try:
+        return datetime.datetime.strptime(expiry, "%d/%m/%y").date().isoformat()
+    except (TypeError, ValueError):
+        return None
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def impact_rows(location, item, poster_id, poster_name, qty, claimed_at):
+    """``(dimension, key, label, boxes)`` counter increments for one claim of ``qty`` boxes.
+
+    Keys are case-folded so "Ward 5" and "ward 5" count together; the label
+    keeps the spelling last seen. Claims from before claim times were
+    recorded (``claimed_at`` None) count towards everything but the months.
+    """
+    location = (location or "").strip()
+    item = (item or "").strip()
+    rows = [
+        ("total", "", "", qty),
+        ("location", location.lower(), location, qty),
+        ("item", item.lower(), item, qty),
+        ("poster", str(poster_id), poster_name or str(poster_id), qty),
+    ]
+    if claimed_at:
+        month = claimed_at[:7]
+        rows.append(("month", month, month, qty))
+        rows.append(("location_month", f"{month}|{location.lower()}", location, qty))
+    return rows
+
+
+@dataclass(slots=True)
+class Claim:
+    user_id: int
+    qty: int
+    time: str | None = None
+    claimed_at: str | None = None
+
+    def to_dict(self):
+        return {"user_id": self.user_id, "qty": self.qty, "time": self.time, "claimed_at": self.claimed_at}
+
+
+@dataclass(slots=True)
+class Listing:
+    id: int
+    poster_id: int
+    poster_name: str | None
+    item: str
+    qty: int
+    remaining: int
+    size: str | None = None
+    expiry: str | None = None
+    location: str | None = None
+    archived: bool = False
+    channel_msg_id: int | None = None
+    kind: str | None = None
+    expiry_date: str | None = None
+    archived_at: str | None = None
+    photos: str | None = None  # space-separated Telegram file_ids, reused when the item is reposted
+    claims: list = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, listing_id, d):
+        """Build from a store dict (or a legacy listings.json entry keyed by channel message id)."""
+        return cls(
+            id=listing_id,
+            poster_id=d["poster_id"],
+            poster_name=d.get("poster_name"),
+            item=d["item"],
+            qty=d["qty"],
+            remaining=d["remaining"],
+            size=_intern(d.get("size")),
+            expiry=_intern(d.get("expiry")),
+            location=_intern(d.get("location")),
+            archived=bool(d.get("archived")),
+            channel_msg_id=d.get("channel_msg_id", listing_id),
+            kind=_intern(d.get("kind")),
+            expiry_date=_intern(d.get("expiry_date") or parse_display_expiry(d.get("expiry"))),
+            archived_at=d.get("archived_at"),
+            photos=d.get("photos"),
+            claims=[Claim(c["user_id"], c["qty"], c.get("time"), c.get("claimed_at")) for c in d.get("claims", ())],
+        )
+
+    def to_dict(self, claims=False):
+        d = {"id": self.id, **{f: getattr(self, f) for f in LISTING_FIELDS}}
+        if claims:
+            d["claims"] = [c.to_dict() for c in self.claims]
+        return d
+
+    def update(self, **changes):
+        unknown = set(changes) - set(LISTING_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown listing fields: {', '.join(sorted(unknown))}")
+        for name, value in changes.items():
+            setattr(self, name, _intern(value) if name in _INTERNED else value)
+
+
+_INTERNED = {"size", "expiry", "location", "kind", "expiry_date"}
+_STRINGS = ("poster_name", "item", "size", "expiry", "location", "kind", "expiry_date", "archived_at", "photos")
+
+
+# ========= SNAPSHOT CODEC =========
+# "LSN3" | u32 string count | (u32 length, utf-8 bytes)* | u32 listing count | listing*
+# listing = id q, poster_id q, qty i, remaining i, archived B, channel_msg_id q,
+#           9 × u32 string refs, u32 claim count, (user_id q, qty i, time ref u32, claimed_at ref u32)*
+# String refs index the string table; _NONE stands for None, _NO_INT for a missing int.
+_MAGIC = b"LSN3"
+_NONE = 0xFFFFFFFF
+_NO_INT = -(1 << 63)
+_U32 = struct.Struct("<I")
+_LISTING = struct.Struct("<qqiiBq9II")
+_CLAIM = struct.Struct("<qiII")
+
+
+def dump_snapshot(listings):
+    """Encode Listing objects as one bytes blob. Each distinct string is stored once."""
+    table = {}
+
+    def ref(s):
+        if s is None:
+            return _NONE
+        i = table.get(s)
+        if i is None:
+            i = table[s] = len(table)
+        return i
+
+    body = bytearray()
+    count = 0
+    for l in listings:
+        count += 1
+        body += _LISTING.pack(
+            l.id, l.poster_id, l.qty, l.remaining, l.archived,
+            _NO_INT if l.channel_msg_id is None else l.channel_msg_id,
+            *(ref(getattr(l, name)) for name in _STRINGS), len(l.claims)
+        )
+        for c in l.claims:
+            body += _CLAIM.pack(c.user_id, c.qty, ref(c.time), ref(c.claimed_at))
+
+    out = bytearray(_MAGIC)
+    out += _U32.pack(len(table))
+    for s in table:
+        raw = s.encode()
+        out += _U32.pack(len(raw))
+        out += raw
+    out += _U32.pack(count)
+    out += body
+    return bytes(out)
+
+
+def load_snapshot(data):
+    """Decode ``dump_snapshot`` output back into a list of Listing objects."""
+    if data[:4] != _MAGIC:
+        raise ValueError("Not a listing snapshot")
+    view = memoryview(data)
+    pos = 4
+    (n,) = _U32.unpack_from(view, pos)
+    pos += 4
+    strings = []
+    for _ in range(n):
+        (length,) = _U32.unpack_from(view, pos)
+        pos += 4
+        strings.append(sys.intern(str(view[pos:pos + length], "utf-8")))
+        pos += length
+    lookup = lambda i: None if i == _NONE else strings[i]
+
+    (count,) = _U32.unpack_from(view, pos)
+    pos += 4
+    listings = []
+    for _ in range(count):
+        (listing_id, poster_id, qty, remaining, archived, channel_msg_id,
+         *refs, n_claims) = _LISTING.unpack_from(view, pos)
+        pos += _LISTING.size
+        claims = []
+        for _ in range(n_claims):
+            user_id, claim_qty, time_ref, claimed_at_ref = _CLAIM.unpack_from(view, pos)
+            pos += _CLAIM.size
+            claims.append(Claim(user_id, claim_qty, lookup(time_ref), lookup(claimed_at_ref)))
+        poster_name, item, size, expiry, location, kind, expiry_date, archived_at, photos = map(lookup, refs)
+        listings.append(Listing(
+            listing_id, poster_id, poster_name, item, qty, remaining, size, expiry, location,
+            bool(archived), None if channel_msg_id == _NO_INT else channel_msg_id,
+            kind, expiry_date, archived_at, photos, claims,
+        ))
+    return listings
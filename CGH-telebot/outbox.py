@@ -0,0 +1,248 @@
+# ==============================
+# 📤 Outbound message dispatcher
+# - Per-chat and global token buckets
+# - Priority classes (DMs before channel traffic)
+# - Automatic retry on RetryAfter / network errors
+# ==============================
+
+import asyncio, datetime, heapq, itertools, logging, time
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+
+log = logging.getLogger(__name__)
+
+PRIORITY_DM, PRIORITY_CHANNEL, PRIORITY_BULK = range(3)
+
+# Methods that post something new; a timed-out call may still have gone through
+_NOT_IDEMPOTENT = ("send_", "forward_", "copy_")
+
+
+class QueueFull(Exception):
+    """Raised on the returned future when the outbox refuses a job."""
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, at most ``burst`` saved up."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def delay(self):
+        """Seconds until a token is available (0 if one is available now)."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class _Job:
+    __slots__ = ("chat_id", "method", "kwargs", "priority", "future", "enqueued", "attempts")
+
+    def __init__(self, chat_id, method, kwargs, priority, future):
+        self.chat_id = chat_id
+        self.method = method
+        self.kwargs = kwargs
+        self.priority = priority
+        self.future = future
+        self.enqueued = time.monotonic()
+        self.attempts = 0
+
+
+def _is_private(chat_id):
+    return isinstance(chat_id, int) and chat_id > 0
+
+
+class Outbox:
+    """Single funnel for every outbound Bot API call that sends or edits messages.
+
+    ``submit`` queues a call such as ``submit(chat_id, "send_message", text=...)``
+    and returns a future with the API result; ``send`` does the same but
+    handlers need not await it. Jobs leave in priority order, subject to a
+    global bucket and one bucket per chat (Telegram allows roughly 30 msg/s
+    overall, 1 msg/s per private chat and 20 msg/min per group or channel).
+    """
+
+    def __init__(self, global_rate=25.0, private_rate=1.0, group_rate=20 / 60,
+                 max_queue=10000, max_attempts=5):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.private_rate = private_rate
+        self.group_rate = group_rate
+        self.max_queue = max_queue
+        self.max_attempts = max_attempts
+        self.bot = None
+        self.on_wait = None
+        self._heap = []
+        self._parked = 0
+        self._seq = itertools.count()
+        self._buckets = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._inflight = set()
+        # metrics
+        self.sent = 0
+        self.retried = 0
+        self.dropped = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    # ----- queueing -----
+    def submit(self, chat_id, method, priority=PRIORITY_DM, **kwargs):
+        future = asyncio.get_running_loop().create_future()
+        job = _Job(chat_id, method, kwargs, priority, future)
+        if self.queue_depth >= self.max_queue:
+            self.dropped += 1
+            future.set_exception(QueueFull(f"Outbox full, dropped {method} to {chat_id}"))
+            return future
+        self._push(job)
+        return future
+
+    def send(self, chat_id, method, priority=PRIORITY_DM, **kwargs):
+        """Fire-and-forget variant of ``submit``; failures are logged."""
+        future = self.submit(chat_id, method, priority, **kwargs)
+        future.add_done_callback(self._log_failure)
+        return future
+
+    @staticmethod
+    def _log_failure(future):
+        if not future.cancelled() and future.exception():
+            log.warning("⚠️ Outbound message failed: %s", future.exception())
+
+    def _push(self, job):
+        heapq.heappush(self._heap, (job.priority, next(self._seq), job))
+        self._wakeup.set()
+
+    def _park(self, job, seconds):
+        self._parked += 1
+
+        def unpark():
+            self._parked -= 1
+            self._push(job)
+
+        asyncio.get_running_loop().call_later(seconds, unpark)
+
+    def _bucket(self, chat_id):
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if _is_private(chat_id):
+                bucket = TokenBucket(self.private_rate, 3)
+            else:
+                bucket = TokenBucket(self.group_rate, 3)
+            self._buckets[chat_id] = bucket
+        return bucket
+
+    @property
+    def queue_depth(self):
+        return len(self._heap) + self._parked
+
+    # ----- dispatching -----
+    async def _run(self):
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            wait = self.global_bucket.delay()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            _, _, job = heapq.heappop(self._heap)
+            wait = self._bucket(job.chat_id).delay()
+            if wait > 0:
+                # This chat is over its budget; let other chats go first.
+                self._park(job, wait)
+                continue
+            self.global_bucket.take()
+            self._bucket(job.chat_id).take()
+            task = asyncio.create_task(self._execute(job))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _execute(self, job):
+        if job.attempts == 0:
+            waited = time.monotonic() - job.enqueued
+            self.wait_count += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            if self.on_wait:
+                self.on_wait(waited)
+        job.attempts += 1
+        try:
+            result = await getattr(self.bot, job.method)(chat_id=job.chat_id, **job.kwargs)
+        except RetryAfter as e:
+            retry_after = e.retry_after
+            if isinstance(retry_after, datetime.timedelta):
+                retry_after = retry_after.total_seconds()
+            self._bucket(job.chat_id).pause(retry_after)
+            self._retry(job, retry_after, e)
+        except (Forbidden, BadRequest) as e:
+            self._fail(job, e)
+        except TimedOut as e:
+            if job.method.startswith(_NOT_IDEMPOTENT):
+                # Retrying could post it twice
+                self._fail(job, e)
+            else:
+                self._retry(job, min(2 ** job.attempts, 30), e)
+        except NetworkError as e:
+            self._retry(job, min(2 ** job.attempts, 30), e)
+        except Exception as e:
+            self._fail(job, e)
+        else:
+            self.sent += 1
+            if not job.future.done():
+                job.future.set_result(result)
+
+    def _retry(self, job, seconds, error):
+        if job.attempts >= self.max_attempts:
+            self._fail(job, error)
+            return
+        self.retried += 1
+        self._park(job, seconds)
+
+    def _fail(self, job, error):
+        self.dropped += 1
+        if not job.future.done():
+            job.future.set_exception(error)
+
+    # ----- lifecycle -----
+    def start(self, bot):
+        self.bot = bot
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout=10.0):
+        """Give queued messages up to ``timeout`` seconds to go out, then stop."""
+        deadline = time.monotonic() + timeout
+        while (self.queue_depth or self._inflight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue_depth,
+            "sent": self.sent,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "wait_avg_seconds": self.wait_total / self.wait_count if self.wait_count else 0.0,
+            "wait_max_seconds": self.wait_max,
+        }
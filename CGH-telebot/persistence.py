@@ -0,0 +1,138 @@
+# ==============================
+# 💾 Conversation / user_data persistence
+# - SQLite key-value table, one row per user/chat/conversation key
+# - Only changed keys are written, in batched transactions
+# ==============================
+
+import asyncio, json, pickle, sqlite3, threading
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+_USER, _CHAT, _BOT, _CALLBACK = "user", "chat", "bot", "callback"
+
+
+class SQLitePersistence(BasePersistence):
+    """``BasePersistence`` backed by an embedded SQLite file.
+
+    Unlike ``PicklePersistence`` nothing is ever dumped wholesale: each
+    user_data/chat_data entry and each conversation key is its own row.
+    Updates are buffered and written together at most every
+    ``flush_interval`` seconds (off the event loop), and a value that pickles
+    to the same bytes as last time is not written at all.
+    """
+
+    def __init__(self, path="state.db", store_data=None, update_interval=5, flush_interval=1.0):
+        super().__init__(store_data=store_data or PersistenceInput(), update_interval=update_interval)
+        self.path = path
+        self.flush_interval = flush_interval
+        self.writes = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS kv (kind TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, "
+            "PRIMARY KEY (kind, key))"
+        )
+        self._written = {}
+        self._pending = {}
+        self._flush_task = None
+
+    # ----- low level -----
+    def _load(self, kind):
+        with self._lock:
+            rows = self._db.execute("SELECT key, value FROM kv WHERE kind=?", (kind,)).fetchall()
+        for key, value in rows:
+            self._written[(kind, key)] = value
+        return {key: pickle.loads(value) for key, value in rows}
+
+    def _stage(self, kind, key, value):
+        blob = None if value is None else pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if blob is not None and self._written.get((kind, key)) == blob:
+            self._pending.pop((kind, key), None)
+            return
+        self._pending[(kind, key)] = blob
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.flush_interval)
+        self._flush_task = None
+        await self._write_pending()
+
+    async def _write_pending(self):
+        batch, self._pending = self._pending, {}
+        if batch:
+            await asyncio.to_thread(self._write, batch)
+
+    def _write(self, batch):
+        with self._lock:
+            self._db.execute("BEGIN")
+            for (kind, key), blob in batch.items():
+                if blob is None:
+                    self._db.execute("DELETE FROM kv WHERE kind=? AND key=?", (kind, key))
+                else:
+                    self._db.execute("INSERT OR REPLACE INTO kv VALUES (?, ?, ?)", (kind, key, blob))
+            self._db.execute("COMMIT")
+        for k, blob in batch.items():
+            if blob is None:
+                self._written.pop(k, None)
+            else:
+                self._written[k] = blob
+        self.writes += len(batch)
+
+    # ----- user / chat / bot data -----
+    async def get_user_data(self):
+        return {int(k): v for k, v in self._load(_USER).items()}
+
+    async def get_chat_data(self):
+        return {int(k): v for k, v in self._load(_CHAT).items()}
+
+    async def get_bot_data(self):
+        return self._load(_BOT).get("", {})
+
+    async def get_callback_data(self):
+        return self._load(_CALLBACK).get("")
+
+    async def update_user_data(self, user_id, data):
+        self._stage(_USER, str(user_id), data)
+
+    async def update_chat_data(self, chat_id, data):
+        self._stage(_CHAT, str(chat_id), data)
+
+    async def update_bot_data(self, data):
+        self._stage(_BOT, "", data)
+
+    async def update_callback_data(self, data):
+        self._stage(_CALLBACK, "", data)
+
+    async def drop_user_data(self, user_id):
+        self._stage(_USER, str(user_id), None)
+
+    async def drop_chat_data(self, chat_id):
+        self._stage(_CHAT, str(chat_id), None)
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    # ----- conversations -----
+    async def get_conversations(self, name):
+        return {tuple(json.loads(k)): v for k, v in self._load(f"conv:{name}").items()}
+
+    async def update_conversation(self, name, key, new_state):
+        # A finished conversation (state None) simply loses its row
+        self._stage(f"conv:{name}", json.dumps(list(key)), new_state)
+
+    async def flush(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self._write_pending()
+        with self._lock:
+            self._db.close()
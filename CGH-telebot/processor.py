@@ -0,0 +1,58 @@
+# ==============================
+# 🚦 Per-user update ordering
+# - Different users' updates run concurrently
+# - One user's updates run one at a time, in arrival order
+# - Keeps ConversationHandler state consistent with concurrent updates on
+# ==============================
+
+import asyncio
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+def _key(update):
+    if not isinstance(update, Update):
+        return None
+    user = update.effective_user
+    chat = update.effective_chat
+    return user.id if user else chat.id if chat else None
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Process updates concurrently, except that updates from the same user are serialised.
+
+    A ConversationHandler reads its state when an update arrives and writes it
+    back when the handler returns, so two updates from one user running side
+    by side (a double tap on a button, a quick second message) would both be
+    handled in the old state. Stock is reserved with a compare-and-swap in the
+    store, so updates from different users still need no ordering.
+    """
+
+    def __init__(self, max_concurrent_updates=256):
+        super().__init__(max_concurrent_updates)
+        self._locks = {}  # user id -> [lock, updates holding or waiting for it]
+
+    async def do_process_update(self, update, coroutine):
+        key = _key(update)
+        if key is None:
+            await coroutine
+            return
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            # asyncio.Lock wakes waiters first come, first served
+            async with entry[0]:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
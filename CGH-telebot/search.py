@@ -0,0 +1,79 @@
+# ==============================
+# 🔎 In-memory search index for active listings
+# - Inverted index over item, size and location
+# - Maintained incrementally as listings come and go
+# - Result lists cached per query until the index changes
+# ==============================
+
+import re
+from collections import OrderedDict, defaultdict
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lower-case word tokens with a naive plural strip ("gloves" → "glove")."""
+    tokens = set()
+    for w in _WORD.findall((text or "").lower()):
+        if len(w) > 3 and w.endswith("s") and not w.endswith("ss"):
+            w = w[:-1]
+        tokens.add(w)
+    return tokens
+
+
+class SearchIndex:
+    """Maps tokens to the set of active listing ids containing them.
+
+    Queries intersect posting sets smallest-first, so their cost depends on
+    the number of matches rather than the number of listings. Sorted result
+    lists are cached per query and dropped whenever the index changes.
+    """
+
+    def __init__(self, cache_size=512):
+        self._postings = defaultdict(set)
+        self._docs = {}
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, listing_id):
+        return listing_id in self._docs
+
+    def add(self, listing_id, *fields):
+        self.remove(listing_id)
+        tokens = set().union(*(tokenize(f) for f in fields))
+        self._docs[listing_id] = tokens
+        for t in tokens:
+            self._postings[t].add(listing_id)
+        self._cache.clear()
+
+    def remove(self, listing_id):
+        tokens = self._docs.pop(listing_id, None)
+        if tokens is None:
+            return
+        for t in tokens:
+            ids = self._postings[t]
+            ids.discard(listing_id)
+            if not ids:
+                del self._postings[t]
+        self._cache.clear()
+
+    def search(self, query=""):
+        """Ids matching every term of ``query`` (all listings if empty), newest first."""
+        key = " ".join(sorted(tokenize(query)))
+        hit = self._cache.get(key)
+        if hit is not None:
+            self._cache.move_to_end(key)
+            return hit
+        if key:
+            postings = sorted((self._postings.get(t, set()) for t in key.split()), key=len)
+            ids = set(postings[0]).intersection(*postings[1:])
+        else:
+            ids = self._docs
+        result = sorted(ids, reverse=True)
+        self._cache[key] = result
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return result
@@ -0,0 +1,851 @@
+# ==============================
+# 📦 Listing storage backends
+# - ListingStore: interface used by the bot handlers
+# - SQLiteListingStore: WAL mode, indexed single-row reads/updates
+# - JSONListingStore: in-memory store saved as a binary snapshot, read from listings.json once
+# - StoreWriter: coalescing background flusher
+# ==============================
+
+import asyncio, datetime, heapq, json, logging, os, sqlite3, tempfile, threading, time
+from contextlib import contextmanager
+from pathlib import Path
+
+from models import LISTING_FIELDS, Claim, Listing, dump_snapshot, impact_rows, load_snapshot, parse_display_expiry
+
+log = logging.getLogger(__name__)
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def snapshot_path(path):
+    """Where JSONListingStore keeps the snapshot for its ``path``, e.g. listings.json.snap."""
+    path = Path(path)
+    return path.with_name(path.name + ".snap")
+
+
+def read_listings_file(path):
+    """``{id: Listing}`` from the snapshot next to ``path`` if there is one, else from the JSON file itself."""
+    path = Path(path)
+    snap = snapshot_path(path)
+    if snap.exists():
+        return {l.id: l for l in load_snapshot(snap.read_bytes())}
+    if path.exists() and path.stat().st_size:
+        return {int(k): Listing.from_dict(int(k), v) for k, v in json.loads(path.read_text()).items()}
+    return {}
+
+
+class ListingStore:
+    """Interface every listing backend implements.
+
+    Listings are plain dicts keyed by listing id. ``get`` returns the listing
+    without its claim history; use ``claims`` to read that separately.
+
+    Writes are staged and become durable on ``flush``. ``pending`` counts the
+    writes staged since the last flush and ``on_dirty`` (if set) is called
+    after each one.
+    """
+
+    pending = 0
+    on_dirty = None
+
+    def _mark_dirty(self):
+        self.pending += 1
+        if self.on_dirty:
+            self.on_dirty()
+
+    def flush(self):
+        """Make staged writes durable. Safe to call from a worker thread."""
+        raise NotImplementedError
+
+    def get(self, listing_id):
+        raise NotImplementedError
+
+    def allocate_id(self):
+        """Reserve a fresh listing id before the listing is posted."""
+        raise NotImplementedError
+
+    def add(self, listing_id, listing):
+        raise NotImplementedError
+
+    def add_many(self, listings):
+        """Add several new listings as one write. Returns their ids, in order."""
+        ids = []
+        for listing in listings:
+            listing_id = self.allocate_id()
+            self.add(listing_id, listing)
+            ids.append(listing_id)
+        return ids
+
+    def update(self, listing_id, **fields):
+        raise NotImplementedError
+
+    def reserve(self, listing_id, user_id, qty, time):
+        """Atomically take ``qty`` off the remaining stock and record the claim.
+
+        This is a compare-and-swap: it only succeeds while at least ``qty``
+        units remain. Returns the new remaining count, or None if the listing
+        is gone or short of stock.
+        """
+        raise NotImplementedError
+
+    def mark_archived(self, listing_id):
+        """Flag a listing as archived. Returns True only for the first caller."""
+        raise NotImplementedError
+
+    def claims(self, listing_id):
+        raise NotImplementedError
+
+    def adjust_stock(self, listing_id, delta):
+        """Add ``delta`` boxes to an open listing's quantity and remaining stock.
+
+        Like ``reserve`` this is a compare-and-swap: it fails (returns None)
+        if the listing is archived or the stock would drop below one (an open
+        listing always has stock; closing it is ``mark_archived``).
+        Returns the new remaining stock.
+        """
+        raise NotImplementedError
+
+    def poster_listings(self, poster_id):
+        """Ids of every listing ``poster_id`` has posted, newest first."""
+        raise NotImplementedError
+
+    def impact(self, dimension, prefix="", limit=None):
+        """Claim counters for ``dimension`` (total, location, item, poster, month or
+        location_month) as ``(key, label, boxes, claims)`` rows, most boxes first.
+
+        ``reserve`` keeps these up to date, so reading them never touches the
+        claim history. ``prefix`` narrows the keys, e.g. "2026-10|" for one
+        month of location_month, and ``limit`` keeps only the top rows.
+        """
+        raise NotImplementedError
+
+    def iter_claims(self, batch=1000):
+        """Every claim still in the store joined with its listing, oldest first, read ``batch`` at a time."""
+        raise NotImplementedError
+
+    def take_digest_batch(self):
+        """Claim every digest listing not yet in a digest message. Returns their ids.
+
+        Claimed listings get channel_msg_id 0 until the digest is sent, so two
+        publishers never pick up the same listing.
+        """
+        raise NotImplementedError
+
+    def digest_listings(self, message_id):
+        """Listings shown in the digest message ``message_id``, in posting order."""
+        raise NotImplementedError
+
+    def cold_candidates(self, archived_before, limit):
+        """Up to ``limit`` listings archived before ``archived_before``, each with its ``claims``."""
+        raise NotImplementedError
+
+    def move_to_cold(self, entries):
+        """Drop listings from the store, remembering ``(id, segment, position, length, claims)``."""
+        raise NotImplementedError
+
+    def cold_location(self, listing_id):
+        """``(segment, position, length)`` of a listing moved to the cold tier, or None."""
+        raise NotImplementedError
+
+    def active_expiries(self):
+        """``(listing_id, expiry_date)`` for every unarchived listing with an expiry."""
+        raise NotImplementedError
+
+    def active_listings(self):
+        """Every listing that still has stock, is not archived and is on the channel (or waiting for a digest)."""
+        raise NotImplementedError
+
+    def unposted(self):
+        """Ids of open listings stored for a channel post that never went out, e.g. a bulk
+        upload cut short by a restart."""
+        raise NotImplementedError
+
+    def claim_count(self):
+        raise NotImplementedError
+
+    def count(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+# ========= SQLITE =========
+_MIGRATIONS = [
+    """
+    CREATE TABLE listings (
+        id          INTEGER PRIMARY KEY,
+        poster_id   INTEGER NOT NULL,
+        poster_name TEXT,
+        item        TEXT NOT NULL,
+        qty         INTEGER NOT NULL,
+        remaining   INTEGER NOT NULL,
+        size        TEXT,
+        expiry      TEXT,
+        location    TEXT
+    );
+    CREATE TABLE claims (
+        id         INTEGER PRIMARY KEY AUTOINCREMENT,
+        listing_id INTEGER NOT NULL REFERENCES listings(id),
+        user_id    INTEGER NOT NULL,
+        qty        INTEGER NOT NULL,
+        time       TEXT
+    );
+    CREATE INDEX idx_listings_poster ON listings(poster_id);
+    CREATE INDEX idx_listings_active ON listings(id) WHERE remaining > 0;
+    CREATE INDEX idx_listings_expiry ON listings(expiry);
+    CREATE INDEX idx_claims_listing ON claims(listing_id);
+    """,
+    """
+    ALTER TABLE listings ADD COLUMN archived INTEGER NOT NULL DEFAULT 0;
+    UPDATE listings SET archived = 1 WHERE remaining <= 0;
+    """,
+    """
+    ALTER TABLE listings ADD COLUMN channel_msg_id INTEGER;
+    ALTER TABLE listings ADD COLUMN kind TEXT;
+    UPDATE listings SET channel_msg_id = id;
+    CREATE TABLE sequences (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+    INSERT INTO sequences VALUES ('listing', (SELECT COALESCE(MAX(id), 0) FROM listings));
+    """,
+    """
+    ALTER TABLE listings ADD COLUMN expiry_date TEXT;
+    UPDATE listings
+       SET expiry_date = '20' || substr(expiry, 7, 2) || '-' || substr(expiry, 4, 2) || '-' || substr(expiry, 1, 2)
+     WHERE expiry GLOB '[0-9][0-9]/[0-9][0-9]/[0-9][0-9]';
+    CREATE INDEX idx_listings_expiry_date ON listings(expiry_date) WHERE archived = 0;
+    """,
+    """
+    ALTER TABLE listings ADD COLUMN archived_at TEXT;
+    UPDATE listings SET archived_at = datetime('now') WHERE archived = 1;
+    CREATE INDEX idx_listings_archived_at ON listings(archived_at) WHERE archived = 1;
+    CREATE TABLE cold_index (
+        id       INTEGER PRIMARY KEY,
+        segment  TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        length   INTEGER NOT NULL,
+        claims   INTEGER NOT NULL
+    );
+    """,
+    """
+    CREATE INDEX idx_listings_channel_msg ON listings(channel_msg_id);
+    """,
+    """
+    ALTER TABLE claims ADD COLUMN claimed_at TEXT;
+    CREATE TABLE impact (
+        dimension TEXT NOT NULL,
+        key       TEXT NOT NULL,
+        label     TEXT NOT NULL,
+        boxes     INTEGER NOT NULL,
+        claims    INTEGER NOT NULL,
+        PRIMARY KEY (dimension, key)
+    ) WITHOUT ROWID;
+    INSERT INTO impact SELECT 'total', '', '', SUM(qty), COUNT(*) FROM claims HAVING COUNT(*) > 0;
+    INSERT INTO impact
+    SELECT 'location', lower(trim(COALESCE(l.location, ''))), MAX(trim(COALESCE(l.location, ''))), SUM(c.qty), COUNT(*)
+      FROM claims c JOIN listings l ON l.id = c.listing_id GROUP BY 2;
+    INSERT INTO impact
+    SELECT 'item', lower(trim(l.item)), MAX(trim(l.item)), SUM(c.qty), COUNT(*)
+      FROM claims c JOIN listings l ON l.id = c.listing_id GROUP BY 2;
+    INSERT INTO impact
+    SELECT 'poster', CAST(l.poster_id AS TEXT), COALESCE(MAX(l.poster_name), CAST(l.poster_id AS TEXT)),
+           SUM(c.qty), COUNT(*)
+      FROM claims c JOIN listings l ON l.id = c.listing_id GROUP BY 2;
+    """,
+    """
+    ALTER TABLE listings ADD COLUMN photos TEXT;
+    """,
+    # Claims imported from listings.json used to skip the impact counters; count them for any
+    # dimension that has nothing yet (a non-empty one already counts claims since moved to the cold tier)
+    """
+    INSERT INTO impact SELECT 'total', '', '', SUM(qty), COUNT(*) FROM claims
+    HAVING COUNT(*) > 0 AND NOT EXISTS (SELECT 1 FROM impact WHERE dimension = 'total');
+    INSERT INTO impact
+    SELECT 'location', lower(trim(COALESCE(l.location, ''))), MAX(trim(COALESCE(l.location, ''))), SUM(c.qty), COUNT(*)
+      FROM claims c JOIN listings l ON l.id = c.listing_id
+     WHERE NOT EXISTS (SELECT 1 FROM impact WHERE dimension = 'location') GROUP BY 2;
+    INSERT INTO impact
+    SELECT 'item', lower(trim(l.item)), MAX(trim(l.item)), SUM(c.qty), COUNT(*)
+      FROM claims c JOIN listings l ON l.id = c.listing_id
+     WHERE NOT EXISTS (SELECT 1 FROM impact WHERE dimension = 'item') GROUP BY 2;
+    INSERT INTO impact
+    SELECT 'poster', CAST(l.poster_id AS TEXT), COALESCE(MAX(l.poster_name), CAST(l.poster_id AS TEXT)),
+           SUM(c.qty), COUNT(*)
+      FROM claims c JOIN listings l ON l.id = c.listing_id
+     WHERE NOT EXISTS (SELECT 1 FROM impact WHERE dimension = 'poster') GROUP BY 2;
+    """,
+    # Fully claimed listings imported from listings.json after migration 2 had run were left open
+    """
+    UPDATE listings SET archived = 1, archived_at = datetime('now') WHERE archived = 0 AND remaining <= 0;
+    """,
+]
+
+_IMPACT_UPSERT = (
+    "INSERT INTO impact (dimension, key, label, boxes, claims) VALUES (?, ?, ?, ?, 1) "
+    "ON CONFLICT (dimension, key) DO UPDATE SET label = excluded.label, boxes = boxes + excluded.boxes, "
+    "claims = claims + 1"
+)
+
+
+class SQLiteListingStore(ListingStore):
+    """SQLite-backed store. Every read and write touches a single row.
+
+    Writes go into one open transaction that ``flush`` commits, so a burst of
+    approvals costs a single fsync. Each write runs in its own savepoint and
+    is rolled back on its own if it fails. The commit itself only appends to
+    the WAL; ``flush`` fsyncs the WAL after letting go of the lock, so reads
+    never wait on the disk.
+
+    With ``shared=True`` several processes use the same file: each write is
+    its own ``BEGIN IMMEDIATE`` transaction, committed straight away, so no
+    process sits on the database write lock between flushes.
+    """
+
+    def __init__(self, path, shared=False):
+        self.path = Path(path)
+        self.shared = shared
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Shared stores commit every write as it happens, so SQLite syncs those itself;
+        # otherwise flush() syncs the WAL outside the lock
+        self._db.execute("PRAGMA synchronous=FULL" if shared else "PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._migrate()
+
+    def _migrate(self):
+        with self._lock:
+            # IMMEDIATE, so processes opening the same file migrate it one at a time
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                version = self._db.execute("PRAGMA user_version").fetchone()[0]
+                for i, script in enumerate(_MIGRATIONS[version:], start=version + 1):
+                    for statement in script.split(";"):
+                        if statement.strip():
+                            self._db.execute(statement)
+                    self._db.execute(f"PRAGMA user_version={i}")
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    @contextmanager
+    def _write(self):
+        with self._lock:
+            if not self._db.in_transaction:
+                self._db.execute("BEGIN IMMEDIATE" if self.shared else "BEGIN")
+            self._db.execute("SAVEPOINT op")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK TO op")
+                self._db.execute("RELEASE op")
+                if self.shared:
+                    self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("RELEASE op")
+            if self.shared:
+                self._db.execute("COMMIT")
+                return
+            self._mark_dirty()
+
+    def flush(self):
+        with self._lock:
+            committed = self._db.in_transaction
+            if committed:
+                self._db.execute("COMMIT")
+            self.pending = 0
+        if committed and not self.shared:
+            self._sync_wal()
+
+    def _sync_wal(self):
+        try:
+            fd = os.open(f"{self.path}-wal", os.O_RDWR)
+        except FileNotFoundError:
+            return  # checkpointed away, and checkpoints sync the database file
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def get(self, listing_id):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM listings WHERE id=?", (listing_id,)).fetchone()
+        if row is None:
+            return None
+        return dict(row)
+
+    def allocate_id(self):
+        with self._write():
+            return self._db.execute(
+                "UPDATE sequences SET value = value + 1 WHERE name = 'listing' RETURNING value"
+            ).fetchone()[0]
+
+    def _insert(self, listing_id, listing):
+        cols = ("id",) + LISTING_FIELDS
+        values = [listing_id] + [listing.get(f) for f in LISTING_FIELDS]
+        values[cols.index("archived")] = int(bool(listing.get("archived")))
+        self._db.execute(
+            f"INSERT INTO listings ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+            values
+        )
+        self._db.execute("UPDATE sequences SET value = MAX(value, ?) WHERE name = 'listing'", (listing_id,))
+        for c in listing.get("claims", []):
+            self._db.execute(
+                "INSERT INTO claims (listing_id, user_id, qty, time, claimed_at) VALUES (?, ?, ?, ?, ?)",
+                (listing_id, c["user_id"], c["qty"], c.get("time"), c.get("claimed_at"))
+            )
+            # The impact migration only counted the claims already in the table
+            self._db.executemany(_IMPACT_UPSERT, impact_rows(
+                listing.get("location"), listing.get("item"), listing.get("poster_id"), listing.get("poster_name"),
+                c["qty"], c.get("claimed_at")
+            ))
+
+    def add(self, listing_id, listing):
+        with self._write():
+            self._insert(listing_id, listing)
+
+    def add_many(self, listings):
+        if not listings:
+            return []
+        with self._write():
+            last = self._db.execute(
+                "UPDATE sequences SET value = value + ? WHERE name = 'listing' RETURNING value", (len(listings),)
+            ).fetchone()[0]
+            ids = list(range(last - len(listings) + 1, last + 1))
+            for listing_id, listing in zip(ids, listings):
+                self._insert(listing_id, listing)
+        return ids
+
+    def update(self, listing_id, **fields):
+        unknown = set(fields) - set(LISTING_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown listing fields: {', '.join(sorted(unknown))}")
+        assignments = ", ".join(f"{f}=?" for f in fields)
+        with self._write():
+            self._db.execute(f"UPDATE listings SET {assignments} WHERE id=?", (*fields.values(), listing_id))
+
+    def reserve(self, listing_id, user_id, qty, time):
+        if qty <= 0:
+            return None
+        with self._write():
+            row = self._db.execute(
+                "UPDATE listings SET remaining = remaining - ? "
+                "WHERE id=? AND remaining >= ? AND archived = 0 "
+                "RETURNING remaining, location, item, poster_id, poster_name",
+                (qty, listing_id, qty)
+            ).fetchone()
+            if row is None:
+                return None
+            claimed_at = _now()
+            self._db.execute(
+                "INSERT INTO claims (listing_id, user_id, qty, time, claimed_at) VALUES (?, ?, ?, ?, ?)",
+                (listing_id, user_id, qty, time, claimed_at)
+            )
+            self._db.executemany(_IMPACT_UPSERT, impact_rows(
+                row["location"], row["item"], row["poster_id"], row["poster_name"], qty, claimed_at
+            ))
+        return row["remaining"]
+
+    def mark_archived(self, listing_id):
+        with self._write():
+            cur = self._db.execute(
+                "UPDATE listings SET archived = 1, archived_at = datetime('now') WHERE id=? AND archived = 0",
+                (listing_id,)
+            )
+        return cur.rowcount == 1
+
+    def claims(self, listing_id):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT user_id, qty, time, claimed_at FROM claims WHERE listing_id=? ORDER BY id", (listing_id,)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def adjust_stock(self, listing_id, delta):
+        with self._write():
+            row = self._db.execute(
+                "UPDATE listings SET qty = qty + ?, remaining = remaining + ? "
+                "WHERE id=? AND archived = 0 AND remaining + ? >= 1 RETURNING remaining",
+                (delta, delta, listing_id, delta)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def poster_listings(self, poster_id):
+        with self._lock:
+            # Answered from idx_listings_poster alone
+            rows = self._db.execute(
+                "SELECT id FROM listings WHERE poster_id=? ORDER BY id DESC", (poster_id,)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def impact(self, dimension, prefix="", limit=None):
+        # key >= prefix seeks to the first match; substr() then keeps only the keys that start with it
+        where = "dimension=?" if not prefix else "dimension=? AND key >= ? AND substr(key, 1, ?) = ?"
+        args = (dimension,) if not prefix else (dimension, prefix, len(prefix), prefix)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT key, label, boxes, claims FROM impact WHERE {where} ORDER BY boxes DESC, key LIMIT ?",
+                (*args, -1 if limit is None else limit)
+            ).fetchall()
+        return [tuple(r) for r in rows]
+
+    def iter_claims(self, batch=1000):
+        last = 0
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT c.id AS claim_id, c.listing_id, l.item, l.size, l.location, l.poster_id, l.poster_name, "
+                    "c.user_id, c.qty, c.time, c.claimed_at "
+                    "FROM claims c JOIN listings l ON l.id = c.listing_id WHERE c.id > ? ORDER BY c.id LIMIT ?",
+                    (last, batch)
+                ).fetchall()
+            if not rows:
+                return
+            last = rows[-1]["claim_id"]
+            for r in rows:
+                d = dict(r)
+                del d["claim_id"]
+                yield d
+
+    def take_digest_batch(self):
+        with self._write():
+            rows = self._db.execute(
+                "UPDATE listings SET channel_msg_id = 0 "
+                "WHERE kind = 'digest' AND channel_msg_id IS NULL RETURNING id"
+            ).fetchall()
+        return sorted(r[0] for r in rows)
+
+    def digest_listings(self, message_id):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM listings WHERE channel_msg_id = ? AND kind = 'digest' ORDER BY id", (message_id,)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def cold_candidates(self, archived_before, limit):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM listings WHERE archived = 1 AND COALESCE(archived_at, '') < ? ORDER BY id LIMIT ?",
+                (archived_before.strftime("%Y-%m-%d %H:%M:%S"), limit)
+            ).fetchall()
+            return [{**dict(r), "claims": self.claims(r["id"])} for r in rows]
+
+    def move_to_cold(self, entries):
+        with self._write():
+            self._db.executemany("INSERT OR REPLACE INTO cold_index VALUES (?, ?, ?, ?, ?)", entries)
+            ids = [(e[0],) for e in entries]
+            self._db.executemany("DELETE FROM claims WHERE listing_id=?", ids)
+            self._db.executemany("DELETE FROM listings WHERE id=?", ids)
+
+    def cold_location(self, listing_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT segment, position, length FROM cold_index WHERE id=?", (listing_id,)
+            ).fetchone()
+        return None if row is None else tuple(row)
+
+    def active_expiries(self):
+        with self._lock:
+            return self._db.execute(
+                "SELECT id, expiry_date FROM listings WHERE archived = 0 AND expiry_date IS NOT NULL"
+            ).fetchall()
+
+    def active_listings(self):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM listings WHERE remaining > 0 AND archived = 0 "
+                "AND (channel_msg_id IS NOT NULL OR kind = 'digest')"
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def unposted(self):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id FROM listings WHERE archived = 0 AND channel_msg_id IS NULL AND kind != 'digest' ORDER BY id"
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM listings").fetchone()[0]
+
+    def claim_count(self):
+        with self._lock:
+            return self._db.execute(
+                "SELECT (SELECT COUNT(*) FROM claims) + (SELECT COALESCE(SUM(claims), 0) FROM cold_index)"
+            ).fetchone()[0]
+
+    def import_json(self, path):
+        """One-off migration from the legacy listings.json file (or the JSON store's snapshot of it)."""
+        data = {k: {f: v for f, v in l.to_dict(claims=True).items() if f != "id"}
+                for k, l in read_listings_file(path).items()}
+        for k, v in data.items():
+            if self.get(int(k)) is None and self.cold_location(int(k)) is None:
+                # Legacy listings were keyed by their channel message id, and left open once fully claimed
+                archived = bool(v.get("archived")) or v.get("remaining", 0) <= 0
+                self.add(int(k), {"channel_msg_id": int(k), "expiry_date": parse_display_expiry(v.get("expiry")), **v,
+                                  "archived": archived, "archived_at": v.get("archived_at") or (_now() if archived else None)})
+        return len(data)
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._db.close()
+
+
+# ========= JSON (LEGACY) =========
+class JSONListingStore(ListingStore):
+    """The original whole-file store, kept for small deployments.
+
+    Listings are held in memory as compact ``Listing`` objects and only turned
+    back into dicts when read. ``flush`` writes them all with the binary
+    snapshot codec to ``listings.json.snap`` (temp file + fsync + rename), so
+    a crash mid-write leaves the previous snapshot intact. ``listings.json``
+    itself is only read while there is no snapshot yet.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._listings = {}
+        self._impact = {}  # (dimension, key) -> [label, boxes, claims]
+        self._by_poster = {}  # poster_id -> set of listing ids
+        self._listings.update(read_listings_file(self.path))
+        self._next_id = max(self._listings, default=0)
+        for l in self._listings.values():
+            self._by_poster.setdefault(l.poster_id, set()).add(l.id)
+            for c in l.claims:
+                self._count_claim(l, c)
+
+    def _count_claim(self, l, c):
+        for dimension, key, label, boxes in impact_rows(l.location, l.item, l.poster_id, l.poster_name,
+                                                        c.qty, c.claimed_at):
+            counter = self._impact.setdefault((dimension, key), [label, 0, 0])
+            counter[0] = label
+            counter[1] += boxes
+            counter[2] += 1
+
+    def flush(self):
+        with self._lock:
+            if not self.pending:
+                return
+            data = dump_snapshot(self._listings.values())
+            self.pending = 0
+        snap = snapshot_path(self.path)
+        fd, tmp = tempfile.mkstemp(dir=snap.parent, prefix=snap.name, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, snap)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def get(self, listing_id):
+        l = self._listings.get(listing_id)
+        return None if l is None else l.to_dict()
+
+    def allocate_id(self):
+        with self._lock:
+            self._next_id += 1
+            return self._next_id
+
+    def add(self, listing_id, listing):
+        with self._lock:
+            self._next_id = max(self._next_id, listing_id)
+            l = self._listings[listing_id] = Listing.from_dict(listing_id, listing)
+            self._by_poster.setdefault(l.poster_id, set()).add(listing_id)
+            for c in l.claims:
+                self._count_claim(l, c)
+            self._mark_dirty()
+
+    def update(self, listing_id, **fields):
+        with self._lock:
+            self._listings[listing_id].update(**fields)
+            self._mark_dirty()
+
+    def reserve(self, listing_id, user_id, qty, time):
+        with self._lock:
+            l = self._listings.get(listing_id)
+            if l is None or qty <= 0 or l.remaining < qty or l.archived:
+                return None
+            l.remaining -= qty
+            claim = Claim(user_id, qty, time, _now())
+            l.claims.append(claim)
+            self._count_claim(l, claim)
+            self._mark_dirty()
+            return l.remaining
+
+    def mark_archived(self, listing_id):
+        with self._lock:
+            l = self._listings.get(listing_id)
+            if l is None or l.archived:
+                return False
+            l.archived = True
+            l.archived_at = _now()
+            self._mark_dirty()
+            return True
+
+    def claims(self, listing_id):
+        return [c.to_dict() for c in self._listings[listing_id].claims]
+
+    def adjust_stock(self, listing_id, delta):
+        with self._lock:
+            l = self._listings.get(listing_id)
+            if l is None or l.archived or l.remaining + delta < 1:
+                return None
+            l.qty += delta
+            l.remaining += delta
+            self._mark_dirty()
+            return l.remaining
+
+    def poster_listings(self, poster_id):
+        with self._lock:
+            return sorted(self._by_poster.get(poster_id, ()), reverse=True)
+
+    def impact(self, dimension, prefix="", limit=None):
+        with self._lock:
+            rows = [(key, label, boxes, claims) for (dim, key), (label, boxes, claims) in self._impact.items()
+                    if dim == dimension and key.startswith(prefix)]
+        order = lambda r: (-r[2], r[0])
+        return sorted(rows, key=order) if limit is None else heapq.nsmallest(limit, rows, key=order)
+
+    def iter_claims(self, batch=1000):
+        with self._lock:
+            claims = [(c.claimed_at or "", l, c) for l in self._listings.values() for c in l.claims]
+        claims.sort(key=lambda t: t[0])
+        for _, l, c in claims:
+            yield {"listing_id": l.id, "item": l.item, "size": l.size, "location": l.location,
+                   "poster_id": l.poster_id, "poster_name": l.poster_name, **c.to_dict()}
+
+    def take_digest_batch(self):
+        with self._lock:
+            ids = [l.id for l in self._listings.values() if l.kind == "digest" and l.channel_msg_id is None]
+            for listing_id in ids:
+                self._listings[listing_id].channel_msg_id = 0
+            if ids:
+                self._mark_dirty()
+        return sorted(ids)
+
+    def digest_listings(self, message_id):
+        return sorted((l.to_dict() for l in list(self._listings.values())
+                       if l.kind == "digest" and l.channel_msg_id == message_id), key=lambda l: l["id"])
+
+    def active_expiries(self):
+        return [(l.id, l.expiry_date) for l in list(self._listings.values()) if not l.archived and l.expiry_date]
+
+    def active_listings(self):
+        return [l.to_dict() for l in list(self._listings.values())
+                if l.remaining > 0 and not l.archived and (l.channel_msg_id is not None or l.kind == "digest")]
+
+    def unposted(self):
+        return sorted(l.id for l in list(self._listings.values())
+                      if not l.archived and l.channel_msg_id is None and l.kind != "digest")
+
+    def count(self):
+        return len(self._listings)
+
+    def claim_count(self):
+        return sum(len(l.claims) for l in self._listings.values())
+
+    def close(self):
+        self.flush()
+
+
+def open_store(spec, shared=False):
+    """Open a store from a ``backend:path`` spec, e.g. ``sqlite:listings.db``.
+
+    ``shared`` opens it for use by several processes at once (SQLite only).
+    """
+    backend, _, path = spec.partition(":")
+    if backend == "sqlite":
+        return SQLiteListingStore(path or "listings.db", shared=shared)
+    if backend == "json":
+        if shared:
+            raise ValueError("The JSON listing store cannot be shared between processes")
+        return JSONListingStore(path or "listings.json")
+    raise ValueError(f"Unknown listing store backend: {backend}")
+
+
+# ========= BACKGROUND WRITER =========
+class StoreWriter:
+    """Flush a store off the event loop, at most once per ``interval`` seconds.
+
+    The store pings ``mark_dirty`` after every staged write; the writer waits
+    for the first ping, lets the rest of the burst pile up for ``interval``
+    seconds and then flushes everything in one go via ``asyncio.to_thread``.
+    Pings may come from worker threads (e.g. the cold mover), so they are
+    handed to the event loop rather than setting the event directly.
+    """
+
+    def __init__(self, store, interval=1.0):
+        self.store = store
+        self.interval = interval
+        self.flushes = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.on_flush = None
+        self._dirty = asyncio.Event()
+        self._loop = None
+        self._task = None
+        store.on_dirty = self.mark_dirty
+
+    def mark_dirty(self):
+        if self._loop is None:
+            self._dirty.set()  # not running, so nothing is waiting on it
+        else:
+            self._loop.call_soon_threadsafe(self._dirty.set)
+
+    @property
+    def queue_depth(self):
+        return self.store.pending
+
+    def stats(self):
+        return {
+            "flushes": self.flushes,
+            "queue_depth": self.queue_depth,
+            "last_flush_seconds": self.last_flush_seconds,
+            "max_flush_seconds": self.max_flush_seconds,
+        }
+
+    async def flush(self):
+        self._dirty.clear()
+        started = time.perf_counter()
+        await asyncio.to_thread(self.store.flush)
+        self.last_flush_seconds = time.perf_counter() - started
+        self.max_flush_seconds = max(self.max_flush_seconds, self.last_flush_seconds)
+        self.flushes += 1
+        if self.on_flush:
+            self.on_flush(self.last_flush_seconds)
+
+    async def _run(self):
+        while True:
+            await self._dirty.wait()
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                log.exception("⚠️ Failed to flush listings")
+
+    def start(self):
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the loop and flush whatever is still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._loop = None
+        await self.flush()
@@ -0,0 +1,146 @@
+# ==============================
+# 🔔 Listing subscriptions
+# - "/subscribe gloves M" style term sets per user
+# - Compiled into a token index; one pass per new listing
+# - Stored in SQLite so every cluster process sees the same set
+# ==============================
+
+import sqlite3, threading
+from collections import defaultdict
+
+from search import tokenize
+
+
+class SubscriptionIndex:
+    """Matches new listings against every user's subscriptions.
+
+    A subscription matches a listing when all of its terms appear among the
+    listing's item, size and location tokens (the same tokens /search uses).
+    Each subscription is filed under one anchor term, its longest and so
+    usually its rarest, so matching a listing only looks at subscriptions
+    anchored on one of the listing's own tokens, however many there are.
+
+    Changes are written to SQLite and bump a version number; ``match``
+    reloads when another process has changed the table.
+    """
+
+    def __init__(self, path="state.db", max_per_user=20):
+        self.max_per_user = max_per_user
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS subscriptions (user_id INTEGER NOT NULL, terms TEXT NOT NULL, "
+            "query TEXT NOT NULL, PRIMARY KEY (user_id, terms))"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS subscriptions_version (n INTEGER NOT NULL)")
+        self._db.execute("INSERT INTO subscriptions_version SELECT 0 WHERE NOT EXISTS "
+                         "(SELECT 1 FROM subscriptions_version)")
+        self._version = None
+        self._anchors = {}
+        self._count = 0
+        self._reload()
+
+    def __len__(self):
+        return self._count
+
+    @staticmethod
+    def _anchor(terms):
+        return max(terms.split(), key=lambda t: (len(t), t))
+
+    def _reload(self):
+        (version,) = self._db.execute("SELECT n FROM subscriptions_version").fetchone()
+        if version == self._version:
+            return
+        anchors = defaultdict(dict)
+        count = 0
+        for user_id, terms in self._db.execute("SELECT user_id, terms FROM subscriptions"):
+            anchors[self._anchor(terms)][(user_id, terms)] = frozenset(terms.split())
+            count += 1
+        self._anchors, self._count, self._version = anchors, count, version
+
+    def _changed(self, added=(), removed=()):
+        """Bump the version inside the current transaction and, once committed, apply the
+        change to the in-memory index unless another process changed the table meanwhile."""
+        (version,) = self._db.execute("UPDATE subscriptions_version SET n = n + 1 RETURNING n").fetchone()
+        self._db.execute("COMMIT")
+        if version != self._version + 1:
+            self._reload()
+            return
+        for user_id, terms in removed:
+            anchored = self._anchors.get(self._anchor(terms))
+            if anchored is not None and anchored.pop((user_id, terms), None) is not None:
+                self._count -= 1
+        for user_id, terms in added:
+            anchored = self._anchors[self._anchor(terms)]
+            if (user_id, terms) not in anchored:
+                self._count += 1
+            anchored[(user_id, terms)] = frozenset(terms.split())
+        self._version = version
+
+    def add(self, user_id, query):
+        """Subscribe ``user_id`` to ``query``. Returns False if it has no usable terms
+        or the user is at ``max_per_user``; re-adding an existing one is fine."""
+        terms = " ".join(sorted(tokenize(query)))
+        if not terms:
+            return False
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                (n,) = self._db.execute("SELECT COUNT(*) FROM subscriptions WHERE user_id=? AND terms != ?",
+                                        (user_id, terms)).fetchone()
+                if n >= self.max_per_user:
+                    self._db.execute("ROLLBACK")
+                    return False
+                self._db.execute("INSERT OR REPLACE INTO subscriptions (user_id, terms, query) VALUES (?, ?, ?)",
+                                 (user_id, terms, query.strip()))
+                self._changed(added=[(user_id, terms)])
+            except BaseException:
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                raise
+        return True
+
+    def remove(self, user_id, query=None):
+        """Drop one subscription, or all of the user's if ``query`` is None. Returns how many went."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                if query is None:
+                    rows = self._db.execute("DELETE FROM subscriptions WHERE user_id=? RETURNING terms",
+                                            (user_id,)).fetchall()
+                else:
+                    rows = self._db.execute("DELETE FROM subscriptions WHERE user_id=? AND terms=? RETURNING terms",
+                                            (user_id, " ".join(sorted(tokenize(query))))).fetchall()
+                if rows:
+                    self._changed(removed=[(user_id, terms) for (terms,) in rows])
+                else:
+                    self._db.execute("COMMIT")
+            except BaseException:
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def queries(self, user_id):
+        """The user's subscriptions as they typed them, oldest first."""
+        with self._lock:
+            return [q for (q,) in self._db.execute(
+                "SELECT query FROM subscriptions WHERE user_id=? ORDER BY rowid", (user_id,))]
+
+    def match(self, *fields):
+        """``{user_id: [terms, ...]}`` for every subscription the listing text satisfies."""
+        tokens = set().union(*(tokenize(f) for f in fields))
+        found = defaultdict(list)
+        with self._lock:
+            self._reload()
+            for t in tokens:
+                for (user_id, key), terms in self._anchors.get(t, {}).items():
+                    if terms <= tokens:
+                        found[user_id].append(key)
+        return found
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,152 @@
+# ==============================
+# 🎟️ Callback tokens
+# - Short opaque tokens in callback_data instead of packed state
+# - Each token maps to a pending claim or proposal record
+# - First tap wins; tokens expire after a TTL
+# ==============================
+
+import json, secrets, sqlite3, threading, time
+from collections import OrderedDict
+
+# Results of TokenStore.consume besides the record itself
+MISSING, EXPIRED, USED = "missing", "expired", "used"
+
+# A record's "type": a buyer's claim request, or a seller's counter-proposal of a pickup time
+CLAIM, PROPOSAL = "claim", "proposal"
+
+
+class _Entry:
+    __slots__ = ("record", "expires_at", "used")
+
+    def __init__(self, record, expires_at, used=False):
+        self.record = record
+        self.expires_at = expires_at
+        self.used = used
+
+
+class TokenStore:
+    """Maps short tokens to pending records for ``ttl`` seconds.
+
+    Tokens this process issued or has seen are answered from memory. Every
+    token is also written to SQLite, so buttons keep working after a restart
+    and in cluster mode, where the buyer's and the seller's updates may be
+    handled by different processes. ``consume`` succeeds exactly once per
+    token, however many times or from wherever it is tapped.
+    """
+
+    def __init__(self, path="state.db", ttl=72 * 3600, nbytes=6):
+        self.ttl = ttl
+        self.nbytes = nbytes
+        self._cache = OrderedDict()  # insertion order is expiry order: the TTL is fixed
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Survives a crash of the bot; a lost token after power loss just means a re-claim
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS tokens (token TEXT PRIMARY KEY, record TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, used INTEGER NOT NULL DEFAULT 0)"
+        )
+        # Only claim requests are counted per listing; replaces idx_tokens_listing, which covered every token
+        self._db.execute("DROP INDEX IF EXISTS idx_tokens_listing")
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_tokens_claims ON tokens(json_extract(record, '$.listing_id')) "
+            "WHERE used = 0 AND json_extract(record, '$.type') = 'claim'"
+        )
+
+    def __len__(self):
+        return len(self._cache)
+
+    def issue(self, record):
+        """Store ``record`` and return a new token (8 url-safe characters by default)."""
+        expires_at = time.time() + self.ttl
+        payload = json.dumps(record)
+        with self._lock:
+            while True:
+                token = secrets.token_urlsafe(self.nbytes)
+                try:
+                    self._db.execute("INSERT INTO tokens (token, record, expires_at) VALUES (?, ?, ?)",
+                                     (token, payload, expires_at))
+                    break
+                except sqlite3.IntegrityError:
+                    continue
+            self._cache[token] = _Entry(record, expires_at)
+        return token
+
+    def _entry(self, token):
+        entry = self._cache.get(token)
+        if entry is None:
+            row = self._db.execute(
+                "SELECT record, expires_at, used FROM tokens WHERE token=?", (token,)
+            ).fetchone()
+            if row is None:
+                return None
+            entry = _Entry(json.loads(row[0]), row[1], bool(row[2]))
+        return entry
+
+    def peek(self, token):
+        """The record behind ``token``, or MISSING / EXPIRED / USED. Does not use it up."""
+        with self._lock:
+            entry = self._entry(token)
+        if entry is None:
+            return MISSING
+        if entry.expires_at < time.time():
+            return EXPIRED
+        if entry.used:
+            return USED
+        return entry.record
+
+    def consume(self, token):
+        """Like ``peek`` but marks the token used; only the first caller gets the record."""
+        with self._lock:
+            entry = self._entry(token)
+            if entry is None:
+                return MISSING
+            if entry.expires_at < time.time():
+                return EXPIRED
+            if entry.used:
+                return USED
+            entry.used = True
+            # Another process may have consumed it first
+            cur = self._db.execute("UPDATE tokens SET used = 1 WHERE token=? AND used = 0", (token,))
+            if cur.rowcount != 1:
+                return USED
+            return entry.record
+
+    def pending(self, listing_ids):
+        """``{listing_id: (requests, boxes)}`` for the unused, unexpired CLAIM tokens of ``listing_ids``.
+
+        Proposals are left out: they wait on the buyer, not the donor. Reads
+        SQLite rather than the cache, so requests issued by other processes
+        are included.
+        """
+        listing_ids = list(listing_ids)
+        if not listing_ids:
+            return {}
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT json_extract(record, '$.listing_id'), COUNT(*), SUM(json_extract(record, '$.qty')) "
+                "FROM tokens WHERE used = 0 AND json_extract(record, '$.type') = 'claim' AND expires_at >= ? "
+                f"AND json_extract(record, '$.listing_id') IN ({', '.join('?' * len(listing_ids))}) GROUP BY 1",
+                (time.time(), *listing_ids)
+            ).fetchall()
+        return {listing_id: (requests, boxes) for listing_id, requests, boxes in rows}
+
+    def purge(self):
+        """Forget expired tokens. Returns how many were dropped from memory."""
+        now = time.time()
+        dropped = 0
+        with self._lock:
+            while self._cache:
+                token, entry = next(iter(self._cache.items()))
+                if entry.expires_at >= now:
+                    break
+                del self._cache[token]
+                dropped += 1
+            self._db.execute("DELETE FROM tokens WHERE expires_at < ?", (now,))
+        return dropped
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,64 @@
+# ==============================
+# 🌐 Webhook serving mode
+# - aiohttp server receives Telegram updates
+# - Updates are handed to PTB through Application.update_queue
+# ==============================
+
+import asyncio, logging, signal
+
+from aiohttp import web
+from telegram import Update
+
+log = logging.getLogger(__name__)
+
+
+def make_web_app(app, path, secret=None):
+    """aiohttp application that feeds POSTed updates into ``app.update_queue``."""
+
+    async def receive(request):
+        if secret and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != secret:
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        await app.update_queue.put(Update.de_json(data, app.bot))
+        return web.Response()
+
+    async def health(request):
+        return web.Response(text="ok")
+
+    web_app = web.Application()
+    web_app.router.add_post(path, receive)
+    web_app.router.add_get("/healthz", health)
+    return web_app
+
+
+async def run_webhook(app, url, listen="0.0.0.0", port=8443, secret=None, path="/telegram"):
+    """Serve ``app`` over a webhook until SIGINT/SIGTERM.
+
+    ``url`` is the public base URL Telegram should call; ``path`` is appended
+    to it. Like ``run_polling`` this runs post_init/post_shutdown.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    runner = web.AppRunner(make_web_app(app, path, secret))
+    async with app:
+        if app.post_init:
+            await app.post_init(app)
+        await app.start()
+        await runner.setup()
+        await web.TCPSite(runner, listen, port).start()
+        await app.bot.set_webhook(url.rstrip("/") + path, secret_token=secret,
+                                  allowed_updates=Update.ALL_TYPES)
+        log.info("🌐 Webhook listening on %s:%s%s", listen, port, path)
+        try:
+            await stop.wait()
+        finally:
+            await runner.cleanup()
+            await app.stop()
+            if app.post_shutdown:
+                await app.post_shutdown(app)